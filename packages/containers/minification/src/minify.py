@@ -29,6 +29,11 @@ except ImportError:
     print("ERROR: Python 3.14+ required for compression.zstd module")
     sys.exit(1)
 
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - fall back to stdlib json
+    orjson = None  # type: ignore
+
 from nixpkgs_extractor import NixpkgsExtractor
 
 # Configure logging
@@ -39,6 +44,13 @@ logging.basicConfig(
 logger = logging.getLogger("fdnix.minify")
 
 
+def _dumps_compact(data: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
 class PackageMinifier:
     def __init__(self, 
                  db_path: str = "minified.db", 
@@ -51,6 +63,8 @@ class PackageMinifier:
         self.dict_capacity = dict_capacity
         self.compressor = None
         self.decompressor = None
+        # Rows written to packages_kv by _populate_database (None until populated)
+        self.inserted_rows: Optional[int] = None
         self.stats = {
             "total_packages": 0,
             "compressed_size": 0,
@@ -70,7 +84,7 @@ class PackageMinifier:
             extractor = NixpkgsExtractor()
             all_packages = extractor.extract_all_packages()
             self.stats["total_packages"] = len(all_packages)
-            logger.info(f"Extracted {len(all_packages)} packages")
+            logger.info("Extracted %d packages", len(all_packages))
             
             # Process the packages
             if not self.process_packages(all_packages):
@@ -86,13 +100,13 @@ class PackageMinifier:
             return True
             
         except Exception as e:
-            logger.error(f"Minification failed: {e}")
+            logger.error("Minification failed: %s", e)
             return False
 
     def process_packages(self, packages: List[Dict[str, Any]]) -> bool:
         """Process a list of packages directly (for testing or custom data sources)"""
         start_time = time.time()
-        logger.info(f"Processing {len(packages)} packages...")
+        logger.info("Processing %d packages...", len(packages))
         
         try:
             # Update package count
@@ -116,7 +130,7 @@ class PackageMinifier:
             return True
             
         except Exception as e:
-            logger.error(f"Package processing failed: {e}")
+            logger.error("Package processing failed: %s", e)
             return False
 
     def _train_dictionary(self, packages: List[Dict[str, Any]]) -> bool:
@@ -129,8 +143,7 @@ class PackageMinifier:
         # Prepare training samples
         samples = []
         for pkg in sample_packages:
-            pkg_json = json.dumps(pkg, separators=(',', ':'), ensure_ascii=False)
-            samples.append(pkg_json.encode('utf-8'))
+            samples.append(_dumps_compact(pkg))
         
         try:
             # Train dictionary
@@ -141,11 +154,11 @@ class PackageMinifier:
                 f.write(dictionary)
             
             self.stats["dict_size"] = len(dictionary)
-            logger.info(f"Dictionary trained and saved: {len(dictionary)} bytes")
+            logger.info("Dictionary trained and saved: %d bytes", len(dictionary))
             return True
             
         except Exception as e:
-            logger.error(f"Dictionary training failed: {e}")
+            logger.error("Dictionary training failed: %s", e)
             return False
 
     def _initialize_compressor(self) -> None:
@@ -175,23 +188,38 @@ class PackageMinifier:
             conn.execute("PRAGMA synchronous=NORMAL")
             conn.execute("PRAGMA cache_size=10000")   # Increase cache size
             
-            # Create schema
-            self._create_schema(conn)
-            
-            # Populate database
-            self._populate_database(conn, packages)
+            # Schema and data go in as one transaction: a single commit (and
+            # WAL sync) instead of one per 1000 packages
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                # Create schema
+                self._create_schema(conn)
+                
+                # Populate database
+                self._populate_database(conn, packages)
+                
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
             
-            # Optimize database
-            conn.execute("VACUUM")
+            # Optimize database (statistics first so VACUUM compacts them too)
             conn.execute("ANALYZE")
+            conn.execute("VACUUM")
+            
+            # Ship the file in rollback-journal mode: leaving WAL mode checkpoints
+            # the WAL into the database once, and readers on the read-only Lambda
+            # layer mount then need no -wal/-shm files (a WAL-mode database
+            # cannot be opened there)
+            conn.execute("PRAGMA journal_mode=DELETE")
             
             conn.close()
             
-            logger.info(f"Database created: {self.db_path.stat().st_size} bytes")
+            logger.info("Database created: %d bytes", self.db_path.stat().st_size)
             return True
             
         except Exception as e:
-            logger.error(f"Database creation failed: {e}")
+            logger.error("Database creation failed: %s", e)
             return False
 
     def _create_schema(self, conn: sqlite3.Connection) -> None:
@@ -216,8 +244,9 @@ class PackageMinifier:
             )
         """)
         
-        # Create indexes for better performance
-        conn.execute("CREATE INDEX idx_packages_fts_id ON packages_fts(id)")
+        # No index on packages_fts: SQLite cannot index virtual tables (the
+        # CREATE INDEX failed schema creation), and FTS5 lookups go through
+        # MATCH / rowid anyway
         
         logger.info("Database schema created")
 
@@ -225,66 +254,57 @@ class PackageMinifier:
         """Populate database with compressed package data"""
         logger.info("Populating database with compressed packages...")
         
-        conn.execute("BEGIN TRANSACTION")
-        
-        try:
-            for i, pkg in enumerate(packages):
-                # Generate package ID
-                pkg_id = f"{pkg['packageName']}-{pkg['version']}"
-                
-                # Prepare package data for compression
-                pkg_data = {
-                    "packageId": pkg_id,
-                    "packageName": pkg["packageName"],
-                    "version": pkg["version"],
-                    "description": pkg["description"],
-                    "homepage": pkg["homepage"],
-                    "license": pkg["license"],
-                    "attributePath": pkg["attributePath"],
-                    "category": pkg.get("category", ""),
-                    "broken": pkg["broken"],
-                    "unfree": pkg["unfree"],
-                    "available": pkg["available"],
-                    "maintainers": pkg["maintainers"],
-                    "platforms": pkg["platforms"],
-                    "longDescription": pkg["longDescription"],
-                    "mainProgram": pkg["mainProgram"],
-                    "position": pkg["position"],
-                    "outputsToInstall": pkg["outputsToInstall"],
-                    "lastUpdated": pkg["lastUpdated"]
-                }
-                
-                # Convert to JSON and compress
-                pkg_json = json.dumps(pkg_data, separators=(',', ':'), ensure_ascii=False)
-                uncompressed_size = len(pkg_json.encode('utf-8'))
-                self.stats["uncompressed_size"] += uncompressed_size
-                
-                compressed_data = self.compressor.compress(pkg_json.encode('utf-8'))
-                self.stats["compressed_size"] += len(compressed_data)
-                
-                # Insert compressed data into key-value table
-                conn.execute(
-                    "INSERT INTO packages_kv (id, data) VALUES (?, ?)",
-                    (pkg_id, compressed_data)
-                )
-                
-                # Insert searchable fields into FTS table
-                conn.execute(
-                    "INSERT INTO packages_fts (id, name, description) VALUES (?, ?, ?)",
-                    (pkg_id, pkg_data["packageName"], pkg_data["description"])
-                )
-                
-                if (i + 1) % 1000 == 0:
-                    logger.info(f"Processed {i + 1}/{len(packages)} packages")
-                    conn.execute("COMMIT")
-                    conn.execute("BEGIN TRANSACTION")
-            
-            conn.execute("COMMIT")
-            logger.info("Database population completed")
+        inserted_rows = 0
+        for i, pkg in enumerate(packages):
+            # Generate package ID
+            pkg_id = f"{pkg['packageName']}-{pkg['version']}"
+            
+            # Prepare package data for compression
+            pkg_data = {
+                "packageId": pkg_id,
+                "packageName": pkg["packageName"],
+                "version": pkg["version"],
+                "description": pkg["description"],
+                "homepage": pkg["homepage"],
+                "license": pkg["license"],
+                "attributePath": pkg["attributePath"],
+                "category": pkg.get("category", ""),
+                "broken": pkg["broken"],
+                "unfree": pkg["unfree"],
+                "available": pkg["available"],
+                "maintainers": pkg["maintainers"],
+                "platforms": pkg["platforms"],
+                "longDescription": pkg["longDescription"],
+                "mainProgram": pkg["mainProgram"],
+                "position": pkg["position"],
+                "outputsToInstall": pkg["outputsToInstall"],
+                "lastUpdated": pkg["lastUpdated"]
+            }
+            
+            # Convert to JSON and compress
+            pkg_json = _dumps_compact(pkg_data)
+            self.stats["uncompressed_size"] += len(pkg_json)
+            
+            compressed_data = self.compressor.compress(pkg_json)
+            self.stats["compressed_size"] += len(compressed_data)
+            
+            # Insert compressed data into key-value table
+            inserted_rows += conn.execute(
+                "INSERT INTO packages_kv (id, data) VALUES (?, ?)",
+                (pkg_id, compressed_data)
+            ).rowcount
+            
+            # Insert searchable fields into FTS table
+            conn.execute(
+                "INSERT INTO packages_fts (id, name, description) VALUES (?, ?, ?)",
+                (pkg_id, pkg_data["packageName"], pkg_data["description"])
+            )
             
-        except Exception as e:
-            conn.execute("ROLLBACK")
-            raise e
+            if (i + 1) % 1000 == 0:
+                logger.info("Processed %d/%d packages", i + 1, len(packages))
+        
+        self.inserted_rows = inserted_rows
+        logger.info("Database population completed: %d rows", inserted_rows)
 
     def _calculate_stats(self) -> None:
         """Calculate compression statistics"""
@@ -307,7 +327,7 @@ class PackageMinifier:
         with open(stats_file, 'w') as f:
             json.dump(stats_output, f, indent=2)
         
-        logger.info(f"Statistics saved to {stats_file}")
+        logger.info("Statistics saved to %s", stats_file)
 
     def verify_database(self) -> bool:
         """Verify the created database and compression dictionary"""
@@ -343,10 +363,10 @@ class PackageMinifier:
                 pkg_id, compressed_data = row
                 try:
                     decompressed = self.decompressor.decompress(compressed_data)
-                    pkg_data = json.loads(decompressed.decode('utf-8'))
-                    logger.info(f"Successfully tested compression/decompression for package: {pkg_data['packageName']}")
+                    pkg_data = json.loads(decompressed)
+                    logger.info("Successfully tested compression/decompression for package: %s", pkg_data['packageName'])
                 except Exception as e:
-                    logger.error(f"Compression/decompression test failed: {e}")
+                    logger.error("Compression/decompression test failed: %s", e)
                     return False
             
             # Test FTS search
@@ -357,7 +377,12 @@ class PackageMinifier:
             kv_count = cursor.fetchone()[0]
             
             if fts_count != kv_count:
-                logger.error(f"FTS count ({fts_count}) doesn't match KV count ({kv_count})")
+                logger.error("FTS count (%d) doesn't match KV count (%d)", fts_count, kv_count)
+                return False
+            
+            # Rows lost on disk after population (e.g. across VACUUM)
+            if self.inserted_rows is not None and kv_count != self.inserted_rows:
+                logger.error("KV count (%d) doesn't match rows inserted (%d)", kv_count, self.inserted_rows)
                 return False
             
             conn.close()
@@ -366,7 +391,7 @@ class PackageMinifier:
             return True
             
         except Exception as e:
-            logger.error(f"Database verification failed: {e}")
+            logger.error("Database verification failed: %s", e)
             return False
 
     def generate_statistics(self) -> Dict[str, Any]:
@@ -1,27 +1,55 @@
 import json
 import logging
+import mmap
+import os
 import subprocess
+import tempfile
 import time
+from collections import deque
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import ijson  # type: ignore
+except Exception:  # pragma: no cover - fall back to parsing the whole document
+    ijson = None  # type: ignore
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - fall back to stdlib json
+    orjson = None  # type: ignore
 
 
 logger = logging.getLogger("fdnix.nixpkgs-extractor")
 
+# Errors raised for malformed or truncated JSON by the active parser
+_PARSE_ERRORS = (ValueError, ijson.JSONError) if ijson is not None else (ValueError,)
+
 
 class NixpkgsExtractor:
     def __init__(self) -> None:
         self.max_retries = 3
         self.retry_delay_sec = 5
+        # Extraction time stamped on every package of a run
+        self._run_ts: Optional[str] = None
 
     def extract_all_packages(self) -> List[Dict[str, Any]]:
         logger.info("Extracting package metadata using nix-env...")
-        raw = self._extract_raw_package_data()
+        self._run_ts = datetime.now(timezone.utc).isoformat()
 
-        logger.info("Processing and cleaning package data...")
-        return self._process_package_data(raw)
+        # nix-env's output goes to a temp file and is parsed incrementally
+        # from there, instead of being held in memory as bytes and then as
+        # one parsed dict
+        with tempfile.TemporaryFile() as output_file:
+            self._extract_raw_package_data(output_file)
+
+            logger.info("Processing and cleaning package data...")
+            try:
+                return self._process_package_data(self._iter_raw_package_data(output_file))
+            except _PARSE_ERRORS as e:
+                raise RuntimeError(f"Failed to parse nix-env JSON output: {e}") from e
 
-    def _extract_raw_package_data(self) -> Dict[str, Any]:
+    def _extract_raw_package_data(self, output_file: BinaryIO) -> None:
         cmd = [
             "nix-env",
             "-qaP",
@@ -34,12 +62,13 @@ class NixpkgsExtractor:
             attempt += 1
             try:
                 logger.info("Running: %s", " ".join(cmd))
-                proc = subprocess.run(
-                    cmd, check=True, timeout=1800, capture_output=True, text=True
+                output_file.seek(0)
+                output_file.truncate()
+                subprocess.run(
+                    cmd, check=True, timeout=1800, stdout=output_file, stderr=subprocess.PIPE
                 )
-                data = json.loads(proc.stdout)
-                logger.info("Successfully extracted %d packages", len(data))
-                return data
+                output_file.flush()
+                return
             except subprocess.CalledProcessError as e:
                 if attempt < self.max_retries:
                     logger.warning(
@@ -50,15 +79,35 @@ class NixpkgsExtractor:
                     )
                     time.sleep(self.retry_delay_sec)
                     continue
-                raise RuntimeError(f"nix-env failed: {e.stderr}") from e
-            except json.JSONDecodeError as e:
-                raise RuntimeError(f"Failed to parse nix-env JSON output: {e}") from e
+                # Only the tail of nix's (potentially huge) stderr is useful
+                tail = deque((e.stderr or b"").splitlines(), maxlen=10)
+                stderr = "\n".join(line.decode("utf-8", errors="replace") for line in tail)
+                raise RuntimeError(f"nix-env failed: {stderr}") from e
+
+    def _iter_raw_package_data(self, output_file: BinaryIO) -> Iterator[Tuple[str, Any]]:
+        """Yield (attribute path, package info) pairs from nix-env's JSON output.
+
+        The file is memory-mapped and the top-level object is parsed
+        incrementally with ijson, so neither a copy of the raw output nor
+        the complete parsed mapping is held in memory.
+        """
+        if os.fstat(output_file.fileno()).st_size == 0:
+            raise ValueError("nix-env produced no output")
+        with mmap.mmap(output_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if ijson is not None:
+                yield from ijson.kvitems(mapped, "", use_float=True)
+            elif orjson is not None:
+                yield from orjson.loads(memoryview(mapped)).items()
+            else:
+                yield from json.loads(mapped[:]).items()
 
-    def _process_package_data(self, raw: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _process_package_data(self, raw: Iterable[Tuple[str, Any]]) -> List[Dict[str, Any]]:
         processed: List[Dict[str, Any]] = []
-        current_ts = datetime.now(timezone.utc).isoformat()
+        if self._run_ts is None:
+            self._run_ts = datetime.now(timezone.utc).isoformat()
+        current_ts = self._run_ts
 
-        for pkg_path, pkg_info in raw.items():
+        for pkg_path, pkg_info in raw:
             try:
                 package_name = (
                     pkg_info.get("pname") or self._extract_package_name_from_path(pkg_path)
@@ -63,15 +63,8 @@ def main() -> int:
         writer = S3JsonlWriter(bucket=bucket, key=output_key, region=region)
         uploaded_key = writer.write_jsonl_file(jsonl_file_path)
         
-        # Get package count from the file for logging
-        package_count = 0
-        try:
-            with open(jsonl_file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip() and not line.strip().startswith('{"_metadata"'):
-                        package_count += 1
-        except Exception as e:
-            logger.warning("Could not count packages in JSONL file: %s", str(e))
+        # Package count was computed by the writer while preparing the upload
+        package_count = writer.package_count
         
         # Output the key for the next stage (can be picked up by Step Functions)
         logger.info("=== STAGE 1 COMPLETED SUCCESSFULLY ===")
@@ -1,16 +1,74 @@
+import functools
+import hashlib
 import logging
 import os
 import shutil
 import subprocess
 import tempfile
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import FrozenSet, Optional
 import platform
 
 
 logger = logging.getLogger("fdnix.nixpkgs-extractor")
 
+# Environment variables that change what nix-eval-jobs emits and therefore
+# participate in the evaluation cache key.
+_CACHE_KEY_ENV_VARS = ("NIXPKGS_ALLOW_UNFREE", "NIXPKGS_ALLOW_BROKEN", "NIX_EVAL_SUPPORTED_SYSTEMS")
+# nix-eval-jobs flags (each taking one value) that only affect resource usage.
+_CACHE_KEY_IGNORED_FLAGS = frozenset({"--workers", "--max-memory-size"})
+_NIXPKGS_URL = "https://github.com/NixOS/nixpkgs.git"
+_NIXPKGS_BRANCH = "release-25.05"
+# git invocation for the nixpkgs clone (wire protocol v2 filters refs server-side)
+_GIT = ("git", "-c", "gc.auto=0", "-c", "core.fsmonitor=false", "-c", "protocol.version=2")
+# Attempts for network git operations, and the pause between them (seconds)
+_GIT_NETWORK_ATTEMPTS = 3
+_GIT_RETRY_DELAY_SEC = 10
+# RAM-backed tmpfs preferred for the evaluation output
+_SHM_DIR = Path("/dev/shm")
+
+
+@functools.lru_cache(maxsize=None)
+def _path_executables(path_value: str) -> FrozenSet[str]:
+    """List entry names across all PATH directories once per PATH value."""
+    known = set()
+    for directory in path_value.split(os.pathsep):
+        try:
+            known.update(os.listdir(directory or "."))
+        except OSError:
+            continue
+    return frozenset(known)
+
+
+def _available_cpus() -> int:
+    """CPUs this process may run on (respects container affinity masks)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def _remove_tree(path: Path) -> None:
+    """Recursively delete path, via rm -rf where available.
+
+    rm unlinks a large tree (a nixpkgs checkout is ~100K files) several
+    times faster than shutil.rmtree's per-entry Python calls.
+    """
+    rm = shutil.which("rm") if os.name == "posix" else None
+    if rm is not None:
+        subprocess.run([rm, "-rf", "--", str(path)], check=False)
+    if path.exists():
+        shutil.rmtree(path)
+
+
+def _require_binaries(*binaries: str) -> None:
+    """Fail fast if any required tool is missing from PATH."""
+    known = _path_executables(os.environ.get("PATH", os.defpath))
+    missing = [b for b in binaries if b not in known]
+    if missing:
+        raise RuntimeError(f"Required tools not found on PATH: {', '.join(missing)}")
+
 
 class NixpkgsExtractor:
     def __init__(self) -> None:
@@ -26,6 +84,8 @@ class NixpkgsExtractor:
         Returns:
             Path to the generated JSONL file
         """
+        _require_binaries("git", "nix-eval-jobs")
+
         # Setup nixpkgs repository
         self._setup_nixpkgs_repo()
         
@@ -33,47 +93,116 @@ class NixpkgsExtractor:
             logger.info("Extracting packages using nix-eval-jobs...")
             jsonl_file_path = self._extract_with_nix_eval_jobs()
             
-            logger.info(f"Successfully created JSONL file: {jsonl_file_path}")
+            logger.info("Successfully created JSONL file: %s", jsonl_file_path)
             
             return jsonl_file_path
         finally:
             self._cleanup_temp_dirs()
 
     def _setup_nixpkgs_repo(self) -> None:
-        """Clone nixpkgs repository and checkout the target branch."""
-        import tempfile
-        
-        # Create temporary directory for nixpkgs
+        """Check out the target branch into the persistent nixpkgs clone.
+
+        An existing clone in the cache directory is updated with a shallow
+        fetch + hard reset; otherwise (or if updating fails) a fresh shallow
+        clone is made there. Scratch files still go to a temp dir.
+        """
         self.temp_dir = Path(tempfile.mkdtemp(prefix="nixpkgs_"))
-        self.nixpkgs_path = self.temp_dir / "nixpkgs"
-        
-        logger.info("Cloning nixpkgs repository to %s", self.nixpkgs_path)
-        
-        # Clone nixpkgs with depth 1 for faster cloning
-        clone_cmd = [
-            "git", "clone", 
-            "--depth", "1",
-            "--branch", "release-25.05",
-            "https://github.com/NixOS/nixpkgs.git",
-            str(self.nixpkgs_path)
-        ]
+        self.nixpkgs_path = self._nixpkgs_cache_dir()
         
         try:
-            logger.info("Cloning nixpkgs repository with shallow depth (faster clone)...")
-            subprocess.run(clone_cmd, check=True, timeout=1200, capture_output=True)
-            logger.info("Successfully cloned nixpkgs release-25.05 branch")
+            if (self.nixpkgs_path / ".git").exists():
+                try:
+                    self._update_nixpkgs_clone()
+                    return
+                except subprocess.CalledProcessError as e:
+                    error_msg = e.stderr.decode() if e.stderr else str(e)
+                    logger.warning("Failed to update cached nixpkgs clone, re-cloning: %s", error_msg)
+                    _remove_tree(self.nixpkgs_path)
+            elif self.nixpkgs_path.exists():
+                # Leftover of an interrupted clone; git refuses non-empty targets
+                _remove_tree(self.nixpkgs_path)
+            self._clone_nixpkgs()
             
         except subprocess.CalledProcessError as e:
             error_msg = e.stderr.decode() if e.stderr else str(e)
             raise RuntimeError(f"Failed to clone/update nixpkgs: {error_msg}") from e
         except subprocess.TimeoutExpired:
             raise RuntimeError("Nixpkgs clone timed out after 20 minutes")
+
+    def _nixpkgs_cache_dir(self) -> Path:
+        """Return where the nixpkgs clone is kept between runs."""
+        override = os.environ.get("NIXPKGS_CACHE_DIR")
+        if override:
+            return Path(override)
+        xdg_cache = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+        return Path(xdg_cache) / "fdnix" / "nixpkgs"
+
+    def _clone_nixpkgs(self) -> None:
+        """Shallow-clone the target branch into nixpkgs_path."""
+        logger.info("Cloning nixpkgs repository to %s", self.nixpkgs_path)
+        self.nixpkgs_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Clone nixpkgs with depth 1 for faster cloning, skipping other
+        # branches and tag refs; gc.auto=0 keeps git from repacking the clone
+        # in the background. No --filter=blob:none: the checkout (and nix
+        # evaluation) needs nearly every blob, so it would only add round trips
+        clone_cmd = [
+            *_GIT, "clone",
+            "--depth", "1",
+            "--single-branch",
+            "--no-tags",
+            "--branch", _NIXPKGS_BRANCH,
+            _NIXPKGS_URL,
+            str(self.nixpkgs_path)
+        ]
+        
+        logger.info("Cloning nixpkgs repository with shallow depth (faster clone)...")
+        self._run_git_network(clone_cmd, "clone", partial_path=self.nixpkgs_path)
+        logger.info("Successfully cloned nixpkgs %s branch", _NIXPKGS_BRANCH)
+
+    def _update_nixpkgs_clone(self) -> None:
+        """Move the cached clone to the branch's latest commit."""
+        logger.info("Updating cached nixpkgs clone at %s", self.nixpkgs_path)
+        git = [*_GIT, "-C", str(self.nixpkgs_path)]
+        self._run_git_network([*git, "fetch", "--depth", "1", "--no-tags", "origin", _NIXPKGS_BRANCH], "fetch")
+        subprocess.run(
+            [*git, "reset", "--hard", "FETCH_HEAD"],
+            check=True, timeout=600, capture_output=True,
+        )
+        logger.info("Updated cached nixpkgs clone to latest %s", _NIXPKGS_BRANCH)
+
+    def _run_git_network(self, cmd: list, what: str, partial_path: Optional[Path] = None) -> None:
+        """Run a git command that talks to the remote, retrying failures.
+
+        Transfers slower than 1 KB/s for 30s are aborted (unless the caller's
+        environment sets its own GIT_HTTP_LOW_SPEED_* limits) so a stalled
+        connection is retried instead of running into the timeout.
+        partial_path is removed before a retry (a failed clone's target).
+        """
+        env = os.environ.copy()
+        env.setdefault("GIT_HTTP_LOW_SPEED_LIMIT", "1000")
+        env.setdefault("GIT_HTTP_LOW_SPEED_TIME", "30")
+        for attempt in range(1, _GIT_NETWORK_ATTEMPTS + 1):
+            try:
+                subprocess.run(cmd, check=True, timeout=1200, capture_output=True, env=env)
+                return
+            except subprocess.CalledProcessError as e:
+                if attempt == _GIT_NETWORK_ATTEMPTS:
+                    raise
+                error_msg = e.stderr.decode(errors="replace").strip() if e.stderr else str(e)
+                logger.warning(
+                    "git %s failed (attempt %d/%d), retrying in %ss: %s",
+                    what, attempt, _GIT_NETWORK_ATTEMPTS, _GIT_RETRY_DELAY_SEC, error_msg,
+                )
+                if partial_path is not None and partial_path.exists():
+                    _remove_tree(partial_path)
+                time.sleep(_GIT_RETRY_DELAY_SEC)
     
     def _cleanup_temp_dirs(self) -> None:
         """Clean up temporary directories."""
         if self.temp_dir and self.temp_dir.exists():
             logger.info("Cleaning up temporary directory: %s", self.temp_dir)
-            shutil.rmtree(self.temp_dir)
+            _remove_tree(self.temp_dir)
     
     def _extract_with_nix_eval_jobs(self) -> str:
         """Extract package data using nix-eval-jobs tool and return JSONL file path."""
@@ -81,7 +210,21 @@ class NixpkgsExtractor:
         system = os.environ.get("NIX_SYSTEM") or self._detect_system()
 
         # Use the Hydra-style evaluation approach as recommended in nix-eval-jobs docs
-        release_nix = self.nixpkgs_path / "pkgs" / "top-level" / "release.nix"
+        release_nix = self._release_expression(
+            self.nixpkgs_path / "pkgs" / "top-level" / "release.nix"
+        )
+
+        # Output written to /dev/shm lives in RAM, so it is held back from the
+        # memory budget the workers are sized against
+        output_dir = self._output_dir()
+        reserved_mb = self._env_int("EVAL_SHM_MIN_FREE_MB", 4096) if output_dir == _SHM_DIR else 0
+
+        # nix-eval-jobs keeps a pool of long-lived evaluator workers and only
+        # restarts one (re-paying libexpr/nixpkgs lib init) once it exceeds
+        # --max-memory-size, so size both to the machine.
+        max_memory_mb = self._env_int("NIX_EVAL_MAX_MEMORY_MB", 6144)
+        workers = self._env_int("NIX_EVAL_WORKERS", self._default_worker_count(max_memory_mb, reserved_mb))
+        logger.info("nix-eval-jobs workers: %d, max memory per worker: %d MB", workers, max_memory_mb)
 
         cmd = [
             "nix-eval-jobs",
@@ -94,46 +237,48 @@ class NixpkgsExtractor:
             "bar-with-logs",
             # "--no-instantiate",  # need to wait till nix-eval-jobs ets another release; this is only in main branch
             "--workers",
-            "4",
+            str(workers),
             "--max-memory-size",
-            "6144",
+            str(max_memory_mb),
             str(release_nix),
         ]
 
         # Create persistent output file
-        output_dir = Path("/tmp")  # Or use current working directory: Path(".")
         tmp_path = output_dir / f"nixpkgs_packages_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.jsonl"
         
+        env = os.environ.copy()
+        # Ensure unfree packages are allowed during evaluation
+        env.setdefault("NIXPKGS_ALLOW_UNFREE", "1")
+        # Allow broken packages to prevent evaluation crashes
+        env.setdefault("NIXPKGS_ALLOW_BROKEN", "1")
+        # Each worker is a separate process whose Boehm GC would otherwise
+        # start one marker thread per CPU; split the CPUs between workers to
+        # avoid oversubscription, and start with a larger heap to skip the
+        # early collections while nixpkgs' lib is being loaded.
+        env.setdefault("GC_NPROCS", str(max(1, _available_cpus() // workers)))
+        env.setdefault("GC_INITIAL_HEAP_SIZE", str(512 * 1024 * 1024))
+        
+        # Nix evaluation is pure for a pinned nixpkgs revision, so a previous
+        # successful run with the same inputs can be reused verbatim.
+        cache_path = self._eval_cache_path(cmd, system, env)
+        if cache_path is not None and self._restore_from_cache(cache_path, tmp_path):
+            return str(tmp_path)
+        
         try:
             logger.info("Running: %s", " ".join(cmd))
             logger.info("Writing output to persistent file: %s", tmp_path)
             
-            env = os.environ.copy()
-            # Ensure unfree packages are allowed during evaluation
-            env.setdefault("NIXPKGS_ALLOW_UNFREE", "1")
-            # Allow broken packages to prevent evaluation crashes
-            env.setdefault("NIXPKGS_ALLOW_BROKEN", "1")
-            
-            # Stream stderr to logger while capturing stdout to file
+            # Capture stdout to file; stderr is inherited so nix-eval-jobs
+            # progress goes straight to the container log stream (CloudWatch)
+            # without being decoded and re-logged line by line in Python.
             with tmp_path.open('wb') as output_file:
                 proc = subprocess.Popen(
                     cmd,
                     stdout=output_file,
-                    stderr=subprocess.PIPE,
+                    stderr=None,
                     env=env,
-                    text=True,
-                    bufsize=1  # Line buffered
                 )
                 
-                # Stream stderr lines to logger for CloudWatch visibility
-                while True:
-                    stderr_line = proc.stderr.readline()
-                    if not stderr_line and proc.poll() is not None:
-                        break
-                    if stderr_line:
-                        # Log each line from nix-eval-jobs stderr
-                        logger.info("nix-eval-jobs: %s", stderr_line.rstrip())
-                
                 # Wait for process to complete and get return code
                 return_code = proc.wait()
                 
@@ -142,6 +287,8 @@ class NixpkgsExtractor:
             
             # Return the JSONL file path instead of parsing it
             logger.info("Successfully generated JSONL file: %s", tmp_path)
+            if cache_path is not None:
+                self._store_in_cache(tmp_path, cache_path)
             return str(tmp_path)
             
         except subprocess.CalledProcessError as e:
@@ -160,6 +307,177 @@ class NixpkgsExtractor:
         except subprocess.TimeoutExpired:
             raise RuntimeError("nix-eval-jobs timed out after 60 minutes")
 
+    def _eval_cache_dir(self) -> Optional[Path]:
+        """Return the evaluation cache directory, or None if caching is disabled."""
+        if os.environ.get("NIX_EVAL_CACHE", "1").strip().lower() in ("0", "false", "no", "off"):
+            return None
+        override = os.environ.get("NIX_EVAL_CACHE_DIR")
+        if override:
+            return Path(override)
+        xdg_cache = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+        return Path(xdg_cache) / "fdnix" / "evaluations"
+
+    def _nixpkgs_revision(self) -> Optional[str]:
+        """Return the commit hash of the checked-out nixpkgs tree."""
+        try:
+            result = subprocess.run(
+                ["git", "-C", str(self.nixpkgs_path), "rev-parse", "HEAD"],
+                check=True, capture_output=True, text=True, timeout=30,
+            )
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+            logger.warning("Could not determine nixpkgs revision, evaluation cache disabled: %s", e)
+            return None
+        return result.stdout.strip() or None
+
+    def _eval_cache_path(self, cmd: list, system: str, env: dict) -> Optional[Path]:
+        """Compute the content-addressed cache path for this evaluation."""
+        cache_dir = self._eval_cache_dir()
+        if cache_dir is None:
+            return None
+        revision = self._nixpkgs_revision()
+        if revision is None:
+            return None
+
+        # The release.nix path depends on where nixpkgs is checked out, so key
+        # on the arguments only and let the revision identify the tree.
+        # Worker tuning flags don't change the evaluation result.
+        args = []
+        skip_next = False
+        for arg in cmd[:-1]:
+            if skip_next:
+                skip_next = False
+                continue
+            if arg in _CACHE_KEY_IGNORED_FLAGS:
+                skip_next = True
+                continue
+            args.append(arg)
+        key_parts = [revision, system, *args]
+        key_parts.extend(f"{name}={env.get(name, '')}" for name in _CACHE_KEY_ENV_VARS)
+        digest = hashlib.sha256("\0".join(key_parts).encode("utf-8")).hexdigest()
+
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.warning("Evaluation cache directory %s unavailable: %s", cache_dir, e)
+            return None
+        self._purge_eval_cache(cache_dir)
+        return cache_dir / f"{digest}.jsonl"
+
+    def _purge_eval_cache(self, cache_dir: Path) -> None:
+        """Remove cached evaluations older than NIX_EVAL_CACHE_MAX_AGE_DAYS."""
+        try:
+            max_age_days = float(os.environ.get("NIX_EVAL_CACHE_MAX_AGE_DAYS", "7"))
+        except ValueError:
+            max_age_days = 7.0
+        cutoff = datetime.now(timezone.utc).timestamp() - max_age_days * 86400
+        for entry in cache_dir.glob("*.jsonl"):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    logger.info("Purging stale evaluation cache entry: %s", entry)
+                    entry.unlink()
+            except OSError:
+                continue
+
+    def _restore_from_cache(self, cache_path: Path, dest: Path) -> bool:
+        """Copy a cached evaluation to dest; returns True on a cache hit."""
+        if not cache_path.is_file() or cache_path.stat().st_size == 0:
+            return False
+        try:
+            shutil.copyfile(cache_path, dest)
+        except OSError as e:
+            logger.warning("Failed to restore cached evaluation %s: %s", cache_path, e)
+            return False
+        logger.info("Reusing cached nix-eval-jobs output for this nixpkgs revision: %s", cache_path)
+        return True
+
+    def _store_in_cache(self, source: Path, cache_path: Path) -> None:
+        """Atomically store a successful evaluation in the cache."""
+        partial = cache_path.with_suffix(".partial")
+        try:
+            shutil.copyfile(source, partial)
+            os.replace(partial, cache_path)
+            logger.info("Stored nix-eval-jobs output in evaluation cache: %s", cache_path)
+        except OSError as e:
+            logger.warning("Failed to store evaluation in cache %s: %s", cache_path, e)
+            partial.unlink(missing_ok=True)
+
+    def _release_expression(self, release_nix: Path) -> Path:
+        """Return the expression file to hand to nix-eval-jobs.
+
+        By default this is release.nix itself. When NIX_EVAL_SUPPORTED_SYSTEMS
+        is set (comma-separated, e.g. "x86_64-linux"), a small wrapper is
+        generated that closes over supportedSystems so nix-eval-jobs only
+        instantiates jobs for those platforms instead of every Hydra system.
+        """
+        systems = [
+            s.strip() for s in os.environ.get("NIX_EVAL_SUPPORTED_SYSTEMS", "").split(",") if s.strip()
+        ]
+        if not systems:
+            return release_nix
+
+        systems_nix = " ".join(f'"{s}"' for s in systems)
+        wrapper = self.temp_dir / "fdnix-release.nix"
+        wrapper.write_text(
+            "# Generated by fdnix nixpkgs-evaluator\n"
+            f"import {release_nix} {{\n"
+            f"  supportedSystems = [ {systems_nix} ];\n"
+            "}\n",
+            encoding="utf-8",
+        )
+        logger.info("Evaluating release.nix for supported systems: %s", ", ".join(systems))
+        return wrapper
+
+    def _output_dir(self) -> Path:
+        """Choose where nix-eval-jobs writes its JSONL output.
+
+        Prefers RAM-backed /dev/shm when it has enough free space, since the
+        file is written once and read straight back for upload. EVAL_OUTPUT_DIR
+        overrides the choice; otherwise falls back to the temp dir (TMPDIR).
+        """
+        override = os.environ.get("EVAL_OUTPUT_DIR")
+        if override:
+            path = Path(override)
+            path.mkdir(parents=True, exist_ok=True)
+            return path
+
+        shm = _SHM_DIR
+        required_mb = self._env_int("EVAL_SHM_MIN_FREE_MB", 4096)
+        try:
+            free_mb = shutil.disk_usage(shm).free // (1024 * 1024)
+            if free_mb >= required_mb and os.access(shm, os.W_OK):
+                logger.info("Using RAM-backed %s for evaluation output (%d MB free)", shm, free_mb)
+                return shm
+            logger.info("Not using %s for evaluation output: %d MB free, %d MB required",
+                        shm, free_mb, required_mb)
+        except OSError:
+            pass
+        return Path(tempfile.gettempdir())
+
+    @staticmethod
+    def _env_int(name: str, default: int) -> int:
+        """Read a positive integer from the environment, falling back to default."""
+        raw = os.environ.get(name)
+        if not raw:
+            return default
+        try:
+            value = int(raw)
+        except ValueError:
+            logger.warning("Ignoring non-integer %s=%r", name, raw)
+            return default
+        return value if value > 0 else default
+
+    @staticmethod
+    def _default_worker_count(max_memory_mb: int, reserved_mb: int = 0) -> int:
+        """Pick a worker count bounded by CPUs and physical memory, less reserved_mb."""
+        cpus = _available_cpus()
+        try:
+            total_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+        except (ValueError, OSError, AttributeError):
+            return max(1, min(cpus, 4))
+        # Workers may overshoot the restart threshold while finishing a job
+        by_memory = int(max(0, total_mb - reserved_mb) // (max_memory_mb * 1.5))
+        return max(1, min(cpus, by_memory))
+
     def _detect_system(self) -> str:
         """Detect Nix system string, defaulting to x86_64-linux."""
         mach = platform.machine().lower()
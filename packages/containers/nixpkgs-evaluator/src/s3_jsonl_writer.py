@@ -1,3 +1,4 @@
+import io
 import json
 import logging
 import os
@@ -11,6 +12,9 @@ import brotli
 
 logger = logging.getLogger("fdnix.s3-jsonl-writer")
 
+# Read size for binary scans over the (multi-hundred-MB) JSONL output.
+_READ_CHUNK_SIZE = 1 << 20
+
 
 class S3JsonlWriter:
     """Simple S3 writer for raw JSONL output from nix-eval-jobs."""
@@ -20,6 +24,8 @@ class S3JsonlWriter:
         self.key = key
         self.region = region
         self.s3_client = boto3.client('s3', region_name=region)
+        # Populated by write_jsonl_file so callers don't need to rescan the file
+        self.package_count = 0
         
     def write_jsonl_file(self, jsonl_file_path: str) -> str:
         """Upload JSONL file directly to S3 with brotli compression.
@@ -38,15 +44,12 @@ class S3JsonlWriter:
         file_size = jsonl_path.stat().st_size
         
         # Count lines to estimate package count (excluding metadata line if present)
-        package_count = 0
         try:
-            with jsonl_path.open('r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip() and not line.strip().startswith('{"_metadata"'):
-                        package_count += 1
-        except Exception as e:
+            package_count = self._count_packages(jsonl_path)
+        except OSError as e:
             logger.warning("Could not count packages in JSONL file: %s", str(e))
             package_count = 0
+        self.package_count = package_count
         
         # Add metadata as first line
         metadata = {
@@ -63,19 +66,25 @@ class S3JsonlWriter:
             logger.info("Uploading JSONL file to s3://%s/%s (~%d packages, %.2f MB)", 
                        self.bucket, self.key, package_count, file_size / 1024 / 1024)
             
-            # Read original file and prepend metadata
-            with jsonl_path.open('r', encoding='utf-8') as f:
-                original_content = f.read()
-            
-            final_content = json.dumps(metadata) + '\n' + original_content
-            
-            # Compress with brotli (moderate compression)
-            compressed_data = brotli.compress(final_content.encode('utf-8'), quality=6)
-            compression_ratio = len(compressed_data) / len(final_content.encode('utf-8'))
+            # Stream metadata + original file through a brotli compressor in
+            # chunks rather than materializing the whole payload in memory
+            compressed = io.BytesIO()
+            compressor = brotli.Compressor(quality=6)
+            header = json.dumps(metadata).encode('utf-8') + b'\n'
+            raw_size = len(header)
+            compressed.write(compressor.process(header))
+            with jsonl_path.open('rb') as f:
+                for chunk in iter(lambda: f.read(_READ_CHUNK_SIZE), b''):
+                    raw_size += len(chunk)
+                    compressed.write(compressor.process(chunk))
+            compressed.write(compressor.finish())
+            compressed_size = compressed.tell()
+            compressed.seek(0)
+            compression_ratio = compressed_size / raw_size
             
             logger.info("Compressed JSONL data: %.2f MB -> %.2f MB (%.1f%% ratio)", 
-                       len(final_content.encode('utf-8')) / 1024 / 1024,
-                       len(compressed_data) / 1024 / 1024,
+                       raw_size / 1024 / 1024,
+                       compressed_size / 1024 / 1024,
                        compression_ratio * 100)
             
             # Add .br extension for compressed file if not already present
@@ -85,7 +94,8 @@ class S3JsonlWriter:
             self.s3_client.put_object(
                 Bucket=self.bucket,
                 Key=compressed_key,
-                Body=compressed_data,
+                Body=compressed,
+                ContentLength=compressed_size,
                 ContentType='application/jsonl',
                 ContentEncoding='br',
                 Metadata={
@@ -107,3 +117,20 @@ class S3JsonlWriter:
         except Exception as e:
             logger.error("Unexpected error during S3 upload: %s", str(e))
             raise RuntimeError(f"Unexpected S3 upload error: {e}") from e
+
+    @staticmethod
+    def _count_packages(jsonl_path: Path) -> int:
+        """Count JSONL records with a chunked binary newline scan."""
+        count = 0
+        last_byte = b'\n'
+        with jsonl_path.open('rb') as f:
+            head = f.read(len(b'{"_metadata"'))
+            f.seek(0)
+            for chunk in iter(lambda: f.read(_READ_CHUNK_SIZE), b''):
+                count += chunk.count(b'\n')
+                last_byte = chunk[-1:]
+        if last_byte != b'\n':
+            count += 1
+        if head == b'{"_metadata"':
+            count -= 1
+        return count
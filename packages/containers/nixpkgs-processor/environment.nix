@@ -11,6 +11,7 @@ in
   (pkgs.python313.withPackages (ps: with ps; [
     boto3
     botocore
+    awscrt
     requests
     httpx
     numpy
@@ -20,6 +21,9 @@ in
     sqlalchemy
     alembic
     brotli
+    orjson
+    uvloop
+    pyahocorasick
     pip
     graph-tool
     zstandard
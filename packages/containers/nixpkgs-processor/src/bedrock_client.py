@@ -8,12 +8,58 @@ import json
 import logging
 import time
 import asyncio
-from typing import List, Tuple
+import hashlib
+import random
+import sqlite3
+import struct
+from array import array
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - fall back to stdlib json
+    orjson = None  # type: ignore
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - numpy only speeds up the cache codecs
+    np = None  # type: ignore
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Keys per SELECT ... IN (...) when probing the embedding cache
+_CACHE_LOOKUP_CHUNK = 500
+# Embedding cache blob formats, stored per row in embedding_cache.fmt
+_CACHE_FORMAT_FLOAT32 = "f32"
+_CACHE_FORMAT_INT8 = "i8"
+# Window occupancy (fraction of either limit) under which rate limiting skips pruning
+_FAST_PATH_OCCUPANCY = 0.8
+# Minimum seconds between embedding progress log lines
+_PROGRESS_LOG_INTERVAL = 1.0
+
+# Error codes treated as throttling (retried and counted by the circuit breaker)
+_THROTTLING_ERROR_CODES = frozenset({"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"})
+# Error codes for transient service-side failures (retried, never counted as throttles);
+# any other 5xx response and connection/read errors are treated the same way
+_TRANSIENT_ERROR_CODES = frozenset({"ServiceUnavailableException", "InternalServerException",
+                                    "ModelNotReadyException", "ModelTimeoutException"})
+
+# Circuit breaker states
+_CIRCUIT_CLOSED = "closed"
+_CIRCUIT_OPEN = "open"
+_CIRCUIT_HALF_OPEN = "half-open"
+
+# Request/response bodies carry hundreds to thousands of floats; orjson
+# parses those several times faster than the stdlib
+_json_dumps = orjson.dumps if orjson is not None else json.dumps
+_json_loads = orjson.loads if orjson is not None else json.loads
+
 
 class BedrockClient:
     """Bedrock embedding client with rate limiting that respects account service quotas."""
@@ -27,13 +73,59 @@ class BedrockClient:
         self.max_rpm = int(os.environ.get('BEDROCK_MAX_RPM', '600'))
         self.max_tokens_per_minute = int(os.environ.get('BEDROCK_MAX_TOKENS_PER_MINUTE', '300000'))
         
-        # Internal rate tracking
-        self.requests_in_minute = []
-        self.tokens_in_minute = []
-        self.last_request_time = 0
+        # Concurrent InvokeModel requests (one text each)
+        self.max_concurrent_requests = max(1, int(os.environ.get('BEDROCK_MAX_CONCURRENCY', '4')))
+        
+        # Internal rate tracking (sliding one-minute window, oldest first):
+        # request send times and, in parallel, their token estimates
+        self.requests_in_minute = deque()
+        self.tokens_in_minute = deque()
+        self._tok_sum = 0  # running total of token counts in tokens_in_minute
+        self._next_slot = 0.0  # monotonic time of the next free pacing slot
+        self._last_progress_log = 0.0  # monotonic time of the last progress line
+        self._model_validated: Optional[bool] = None  # cached validate_model_access result
+        # Below these occupancies a request is admitted without pruning the windows
+        self._fast_path_rpm = self.max_rpm * _FAST_PATH_OCCUPANCY
+        self._fast_path_tokens = self.max_tokens_per_minute * _FAST_PATH_OCCUPANCY
         
-        # AWS client
-        self.bedrock_runtime = boto3.client('bedrock-runtime', region_name=self.region)
+        # Throttling: per-request retries plus a global circuit breaker that
+        # pauses all workers after repeated throttles, then lets a single
+        # probe request through before resuming
+        self.max_throttle_retries = int(os.environ.get('BEDROCK_THROTTLE_RETRIES', '5'))
+        self.throttle_threshold = int(os.environ.get('BEDROCK_THROTTLE_THRESHOLD', '3'))
+        self.throttle_cooldown = float(os.environ.get('BEDROCK_THROTTLE_COOLDOWN', '30'))
+        # Transient (5xx / connection) failures get their own bounded retries
+        self.max_transient_retries = int(os.environ.get('BEDROCK_TRANSIENT_RETRIES', '2'))
+        self._throttle_streak = 0
+        self._circuit_state = _CIRCUIT_CLOSED
+        self._cooldown_until = 0.0
+        self._probe_in_flight = False
+        self._probe_done: Optional[asyncio.Event] = None
+        
+        # AWS client: one long-lived client whose connection pool covers all
+        # concurrent requests, with keep-alive so TLS sessions are reused
+        self.bedrock_runtime = boto3.client(
+            'bedrock-runtime',
+            region_name=self.region,
+            config=Config(
+                max_pool_connections=max(10, self.max_concurrent_requests * 2),
+                tcp_keepalive=True,
+                connect_timeout=10,
+                read_timeout=30,
+                # Retries happen in _generate_embeddings_request, where throttles
+                # are counted by the circuit breaker and transient errors are
+                # not; botocore retrying too would multiply the attempts and
+                # hide throttles from the breaker
+                retries={'total_max_attempts': 1, 'mode': 'standard'},
+            ),
+        )
+        
+        # Optional persistent embedding cache (content-addressed by model/dimensions/text)
+        self._cache: Optional[sqlite3.Connection] = None
+        self.cache_int8 = os.environ.get('BEDROCK_CACHE_INT8', 'false').strip().lower() in {'1', 'true', 'yes', 'on'}
+        cache_path = os.environ.get('BEDROCK_CACHE_PATH')
+        if cache_path:
+            self._open_cache(cache_path)
         
         logger.info(
             f"Initialized Bedrock client for {self.model_id} | "
@@ -41,6 +133,87 @@ class BedrockClient:
             f"max_rpm={self.max_rpm}, max_tokens_per_minute={self.max_tokens_per_minute}"
         )
     
+    def _open_cache(self, cache_path: str) -> None:
+        """Open (or create) the sqlite embedding cache."""
+        try:
+            Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(cache_path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache (key BLOB PRIMARY KEY, dim INTEGER NOT NULL, "
+                f"fmt TEXT NOT NULL DEFAULT '{_CACHE_FORMAT_FLOAT32}', vec BLOB NOT NULL) WITHOUT ROWID"
+            )
+            # Caches created before the format column held only float32 blobs
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(embedding_cache)")}
+            if "fmt" not in columns:
+                conn.execute(
+                    f"ALTER TABLE embedding_cache ADD COLUMN fmt TEXT NOT NULL DEFAULT '{_CACHE_FORMAT_FLOAT32}'"
+                )
+            conn.commit()
+            self._cache = conn
+            logger.info("Using embedding cache at %s", cache_path)
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache unavailable at %s: %s", cache_path, e)
+            self._cache = None
+    
+    def _cache_key(self, text: str) -> bytes:
+        """Content-addressed cache key for a text under the current model settings."""
+        return hashlib.sha256(
+            f"{self.model_id}|{self.output_dimensions}|{text}".encode('utf-8')
+        ).digest()
+    
+    def _cache_get_many(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        """Fetch cached embeddings for the given keys."""
+        found: Dict[bytes, List[float]] = {}
+        for i in range(0, len(keys), _CACHE_LOOKUP_CHUNK):
+            chunk = keys[i:i + _CACHE_LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            for key, fmt, vec in self._cache.execute(
+                f"SELECT key, fmt, vec FROM embedding_cache WHERE key IN ({placeholders})", chunk
+            ):
+                found[key] = self._decode_vector(fmt, vec).tolist()
+        return found
+    
+    def _cache_put_many(self, entries: List[Tuple[bytes, List[float]]]) -> None:
+        """Store embeddings as float32 (or int8, if configured) blobs."""
+        self._cache.executemany(
+            "INSERT OR IGNORE INTO embedding_cache (key, dim, fmt, vec) VALUES (?, ?, ?, ?)",
+            ((key, len(vec), *self._encode_vector(vec)) for key, vec in entries)
+        )
+        self._cache.commit()
+    
+    def _encode_vector(self, vec: Sequence[float]) -> Tuple[str, bytes]:
+        """Pack an embedding for the cache, returning its format tag and blob;
+        int8 (a float32 per-vector scale followed by the quantized values)
+        roughly quarters the stored size.
+        """
+        if self.cache_int8:
+            return _CACHE_FORMAT_INT8, self._quantize_int8(vec)
+        return _CACHE_FORMAT_FLOAT32, array('f', vec).tobytes()
+    
+    @staticmethod
+    def _quantize_int8(vec: Sequence[float]) -> bytes:
+        """Symmetric per-vector int8 quantization: value ~= q * scale."""
+        if np is not None:
+            values = np.asarray(vec, dtype=np.float32)
+            peak = float(np.abs(values).max()) if values.size else 0.0
+            scale = peak / 127 if peak else 1.0
+            quantized = np.clip(np.rint(values / scale), -127, 127).astype(np.int8)
+            return struct.pack('<f', scale) + quantized.tobytes()
+        peak = max((abs(v) for v in vec), default=0.0)
+        scale = peak / 127 if peak else 1.0
+        quantized = array('b', (max(-127, min(127, round(v / scale))) for v in vec))
+        return struct.pack('<f', scale) + quantized.tobytes()
+    
+    @staticmethod
+    def _decode_vector(fmt: str, vec: bytes) -> Sequence[float]:
+        """Unpack a cached embedding according to its stored format tag."""
+        if fmt == _CACHE_FORMAT_INT8:
+            (scale,) = struct.unpack_from('<f', vec)
+            if np is not None:
+                return np.frombuffer(vec, dtype=np.int8, offset=4).astype(np.float32) * np.float32(scale)
+            return array('f', (q * scale for q in array('b', vec[4:])))
+        return array('f', vec)
+    
     def _estimate_tokens(self, text: str) -> int:
         """Estimate token count for rate limiting.
         
@@ -54,84 +227,195 @@ class BedrockClient:
         # Use the higher of the two estimates for safety
         return max(char_based_tokens, word_count)
     
-    def _clean_old_requests(self):
+    def _clean_old_requests(self, now: float) -> None:
         """Remove requests/tokens older than 1 minute."""
-        current_time = time.time()
-        cutoff_time = current_time - 60  # 1 minute ago
+        cutoff_time = now - 60  # 1 minute ago
         
-        self.requests_in_minute = [t for t in self.requests_in_minute if t > cutoff_time]
-        self.tokens_in_minute = [(t, count) for t, count in self.tokens_in_minute if t > cutoff_time]
+        while self.requests_in_minute and self.requests_in_minute[0] <= cutoff_time:
+            self.requests_in_minute.popleft()
+            self._tok_sum -= self.tokens_in_minute.popleft()
     
     async def _wait_for_rate_limit(self, estimated_tokens: int):
-        """Wait if necessary to respect rate limits."""
-        current_time = time.time()
-        
-        # Clean old requests
-        self._clean_old_requests()
-        
-        # Check RPM limit
-        if len(self.requests_in_minute) >= self.max_rpm:
-            oldest_request = min(self.requests_in_minute)
-            wait_time = 60 - (current_time - oldest_request) + 0.1  # Add small buffer
-            if wait_time > 0:
-                logger.info(f"Rate limit: waiting {wait_time:.1f}s for RPM limit")
-                await asyncio.sleep(wait_time)
-                self._clean_old_requests()
-        
-        # Check token limit
-        current_tokens = sum(count for _, count in self.tokens_in_minute)
-        if current_tokens + estimated_tokens > self.max_tokens_per_minute:
-            if self.tokens_in_minute:
-                oldest_token_time = min(t for t, _ in self.tokens_in_minute)
-                wait_time = 60 - (current_time - oldest_token_time) + 0.1  # Add small buffer
-                if wait_time > 0:
-                    logger.info(f"Rate limit: waiting {wait_time:.1f}s for token limit")
-                    await asyncio.sleep(wait_time)
-                    self._clean_old_requests()
-        
-        # Minimum delay between requests
-        time_since_last = current_time - self.last_request_time
+        """Wait for capacity in the rate windows, then reserve it for this request.
+        
+        The capacity check and the reservation happen without an intervening
+        await, so concurrent requests on the event loop can never both claim
+        the last slot and no lock is needed. Admitted requests are also paced
+        into evenly spaced send slots.
+        """
         min_delay = 60.0 / self.max_rpm  # Spread requests evenly
-        if time_since_last < min_delay:
-            await asyncio.sleep(min_delay - time_since_last)
+        
+        while True:
+            now = time.monotonic()
+            # Stale entries only overstate occupancy, so while the windows are
+            # well under both limits the prune can be skipped entirely
+            if (len(self.requests_in_minute) >= self._fast_path_rpm
+                    or self._tok_sum + estimated_tokens >= self._fast_path_tokens):
+                self._clean_old_requests(now)
+            
+            # Check RPM limit, then token limit (a single oversized request is
+            # still admitted into an empty window)
+            if len(self.requests_in_minute) >= self.max_rpm:
+                wait_time = 60 - (now - self.requests_in_minute[0]) + 0.1  # Add small buffer
+                logger.info("Rate limit: waiting %.1fs for RPM limit", wait_time)
+                await asyncio.sleep(wait_time)
+                continue
+            if self.requests_in_minute and self._tok_sum + estimated_tokens > self.max_tokens_per_minute:
+                wait_time = 60 - (now - self.requests_in_minute[0]) + 0.1  # Add small buffer
+                logger.info("Rate limit: waiting %.1fs for token limit", wait_time)
+                await asyncio.sleep(wait_time)
+                continue
+            
+            # Reserve capacity at the next free pacing slot
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + min_delay
+            self.requests_in_minute.append(slot)
+            self.tokens_in_minute.append(estimated_tokens)
+            self._tok_sum += estimated_tokens
+            break
+        
+        if slot > now:
+            await asyncio.sleep(slot - now)
+    
+    def _invoke_model(self, text: str) -> List[float]:
+        """Blocking InvokeModel call returning the embedding for one text."""
+        response = self.bedrock_runtime.invoke_model(
+            modelId=self.model_id,
+            accept='application/json',
+            contentType='application/json',
+            body=_json_dumps({"inputText": text, "dimensions": self.output_dimensions})
+        )
+        return _json_loads(response['body'].read())['embedding']
+    
+    @staticmethod
+    def _is_throttling_error(error: Exception) -> bool:
+        """Whether an InvokeModel error is a throttling response."""
+        if not isinstance(error, ClientError):
+            return False
+        return error.response.get("Error", {}).get("Code") in _THROTTLING_ERROR_CODES
+    
+    @staticmethod
+    def _is_transient_error(error: Exception) -> bool:
+        """Whether an InvokeModel error is a retryable non-throttling failure."""
+        if isinstance(error, (BotoConnectionError, HTTPClientError)):
+            return True
+        if not isinstance(error, ClientError):
+            return False
+        if error.response.get("Error", {}).get("Code") in _TRANSIENT_ERROR_CODES:
+            return True
+        return error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500
+    
+    @staticmethod
+    def _retry_delay(error: Exception, attempt: int) -> float:
+        """Delay before retrying a throttled request.
+        
+        Honors the server's Retry-After header when present (plus a little
+        jitter, never less than the hint); otherwise uses exponential backoff
+        with full jitter so retrying workers don't stay in lockstep.
+        """
+        headers = getattr(error, "response", {}).get("ResponseMetadata", {}).get("HTTPHeaders", {})
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, 1)
+            except ValueError:
+                pass
+        return random.uniform(0, min(2 ** attempt, 60))
+    
+    async def _await_circuit(self) -> bool:
+        """Block while the circuit is open; returns True if this request is the half-open probe."""
+        while True:
+            if self._circuit_state == _CIRCUIT_CLOSED:
+                return False
+            if self._circuit_state == _CIRCUIT_OPEN:
+                remaining = self._cooldown_until - time.monotonic()
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+                    continue
+                self._circuit_state = _CIRCUIT_HALF_OPEN
+            # Half-open: exactly one probe request; everyone else waits for its outcome
+            if not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._probe_done = asyncio.Event()
+                return True
+            await self._probe_done.wait()
+    
+    def _record_success(self, probe: bool) -> None:
+        self._throttle_streak = 0
+        if probe:
+            logger.info("Bedrock probe request succeeded; resuming requests")
+            self._circuit_state = _CIRCUIT_CLOSED
+            self._finish_probe(probe)
+    
+    def _record_throttle(self, probe: bool) -> None:
+        self._throttle_streak += 1
+        if probe or self._throttle_streak >= self.throttle_threshold:
+            if self._circuit_state != _CIRCUIT_OPEN:
+                logger.warning("Bedrock throttled %d times in a row; pausing all requests for %.0fs",
+                               self._throttle_streak, self.throttle_cooldown)
+            self._circuit_state = _CIRCUIT_OPEN
+            self._cooldown_until = time.monotonic() + self.throttle_cooldown
+        self._finish_probe(probe)
+    
+    def _finish_probe(self, probe: bool) -> None:
+        if probe:
+            self._probe_in_flight = False
+            if self._probe_done is not None:
+                self._probe_done.set()
+    
+    async def _generate_embeddings_request(self, text: str, estimated_tokens: Optional[int] = None) -> List[float]:
+        """Embed one text in a rate-limited request, retrying on throttling
+        and on transient service or connection errors.
+        """
+        if estimated_tokens is None:
+            estimated_tokens = self._estimate_tokens(text)
+        
+        attempt = 0
+        transient_attempt = 0
+        while True:
+            probe = await self._await_circuit()
+            try:
+                await self._wait_for_rate_limit(estimated_tokens)
+                embedding = await asyncio.to_thread(self._invoke_model, text)
+            except Exception as e:
+                if not self._is_throttling_error(e):
+                    # Not a throttle: the circuit breaker only counts throttles
+                    if probe:
+                        self._record_success(probe)
+                    if not self._is_transient_error(e) or transient_attempt >= self.max_transient_retries:
+                        raise
+                    delay = self._retry_delay(e, transient_attempt)
+                    transient_attempt += 1
+                    logger.info("Bedrock request failed transiently (attempt %d/%d): %s; retrying in %.1fs",
+                                transient_attempt, self.max_transient_retries, e, delay)
+                    await asyncio.sleep(delay)
+                    continue
+                self._record_throttle(probe)
+                if attempt >= self.max_throttle_retries:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                attempt += 1
+                logger.info("Bedrock throttled (attempt %d/%d); retrying in %.1fs",
+                            attempt, self.max_throttle_retries, delay)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled mid-request: a probe must still release the
+                # requests waiting on its outcome
+                self._finish_probe(probe)
+                raise
+            self._record_success(probe)
+            return embedding
     
     async def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for a single text with rate limiting."""
         if not text:
             raise ValueError("Empty text provided")
         
-        estimated_tokens = self._estimate_tokens(text)
-        await self._wait_for_rate_limit(estimated_tokens)
-        
-        current_time = time.time()
-        
-        # Prepare request
-        request_body = {
-            "inputText": text,
-            "dimensions": self.output_dimensions
-        }
-        
         try:
-            response = self.bedrock_runtime.invoke_model(
-                modelId=self.model_id,
-                accept='application/json',
-                contentType='application/json',
-                body=json.dumps(request_body)
-            )
-            
-            # Parse response
-            response_body = json.loads(response['body'].read())
-            embedding = response_body['embedding']
-            
-            # Track rate limiting
-            self.requests_in_minute.append(current_time)
-            self.tokens_in_minute.append((current_time, estimated_tokens))
-            self.last_request_time = current_time
-            
-            return embedding
-            
+            return await self._generate_embeddings_request(text)
         except Exception as e:
-            logger.error(f"Failed to generate embedding: {e}")
+            logger.error("Failed to generate embedding: %s", e)
             raise
     
     async def generate_embeddings_batch(self, texts_with_ids: List[Tuple[str, str]]) -> List[Tuple[str, List[float]]]:
@@ -139,51 +423,150 @@ class BedrockClient:
         if not texts_with_ids:
             return []
         
-        logger.info(f"Starting embedding generation for {len(texts_with_ids)} texts with rate limiting")
+        logger.info("Starting embedding generation for %d texts with rate limiting", len(texts_with_ids))
+        
+        # Identical texts (e.g. shared or empty descriptions) are embedded once
+        # under the first record id that carries them, then fanned back out.
+        first_ids: Dict[str, str] = {}
+        for record_id, text in texts_with_ids:
+            first_ids.setdefault(text, record_id)
+        if len(first_ids) == len(texts_with_ids):
+            return await self._generate_embeddings_cached(texts_with_ids)
+        
+        logger.info("Deduplicated %d texts to %d unique", len(texts_with_ids), len(first_ids))
+        unique = [(record_id, text) for text, record_id in first_ids.items()]
+        embedded = dict(await self._generate_embeddings_cached(unique))
+        
+        results = []
+        for record_id, text in texts_with_ids:
+            embedding = embedded.get(first_ids[text])
+            if embedding is not None:
+                results.append((record_id, embedding))
+        return results
+    
+    async def _generate_embeddings_cached(self, texts_with_ids: List[Tuple[str, str]]) -> List[Tuple[str, List[float]]]:
+        """Generate embeddings, serving hits from the persistent cache when enabled."""
+        if self._cache is None:
+            return await self._generate_embeddings_uncached(texts_with_ids)
+        
+        keys = [self._cache_key(text) for _, text in texts_with_ids]
+        try:
+            cached = self._cache_get_many(keys)
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache lookup failed: %s", e)
+            cached = {}
+        
+        pending = [item for item, key in zip(texts_with_ids, keys) if key not in cached]
+        logger.info("Embedding cache: %d hits, %d misses", len(texts_with_ids) - len(pending), len(pending))
+        
+        fresh = dict(await self._generate_embeddings_uncached(pending)) if pending else {}
         
         results = []
-        failed_count = 0
+        new_entries = []
+        for (record_id, _), key in zip(texts_with_ids, keys):
+            embedding = cached.get(key)
+            if embedding is None:
+                embedding = fresh.get(record_id)
+                if embedding is None:
+                    continue
+                new_entries.append((key, embedding))
+            results.append((record_id, embedding))
         
-        for i, (record_id, text) in enumerate(texts_with_ids):
+        if new_entries:
             try:
-                if i % 10 == 0:  # Log progress every 10 requests
-                    logger.info(f"Processing embedding {i+1}/{len(texts_with_ids)}")
-                
-                embedding = await self.generate_embedding(text)
-                results.append((record_id, embedding))
-                
-            except Exception as e:
-                logger.warning(f"Failed to generate embedding for {record_id}: {e}")
-                failed_count += 1
-                continue
+                self._cache_put_many(new_entries)
+            except sqlite3.Error as e:
+                logger.warning("Failed to store embeddings in cache: %s", e)
+        
+        return results
+    
+    async def _generate_embeddings_uncached(self, texts_with_ids: List[Tuple[str, str]]) -> List[Tuple[str, List[float]]]:
+        """Generate embeddings via the Bedrock API, bypassing the cache.
+        
+        Requests run on a bounded worker pool and results keep the input order.
+        """
+        valid = [(record_id, text) for record_id, text in texts_with_ids if text]
+        failed_count = len(texts_with_ids) - len(valid)
+        worker_count = min(self.max_concurrent_requests, len(valid))
+        
+        logger.info("Embedding %d texts (max %d concurrent requests)", len(valid), worker_count)
+        
+        # Workers write each vector straight into its preallocated input slot
+        # as soon as its request returns, so no per-worker result lists are
+        # built and nothing needs re-sorting afterwards.
+        embeddings: List[Optional[List[float]]] = [None] * len(valid)
+        completed = 0
+        
+        # Fixed pool of workers fed through a bounded queue: concurrency is
+        # capped by the pool size and only a handful of requests are queued
+        # at a time, instead of one task per request created up front.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, worker_count) * 4)
+        
+        async def worker() -> None:
+            nonlocal completed
+            while True:
+                index = await queue.get()
+                try:
+                    if index is None:
+                        return
+                    record_id, text = valid[index]
+                    try:
+                        embeddings[index] = await self._generate_embeddings_request(text)
+                    except Exception as e:
+                        logger.warning("Failed to generate embedding for %s: %s", record_id, e)
+                    completed += 1
+                    self._log_progress(completed, len(valid))
+                finally:
+                    queue.task_done()
         
-        logger.info(f"Embedding generation completed: {len(results)}/{len(texts_with_ids)} successful, {failed_count} failed")
+        workers = [asyncio.create_task(worker()) for _ in range(worker_count)]
+        try:
+            for index in range(len(valid)):
+                await queue.put(index)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+        
+        results = [
+            (record_id, embedding)
+            for (record_id, _), embedding in zip(valid, embeddings)
+            if embedding is not None
+        ]
+        failed_count += len(valid) - len(results)
+        
+        logger.info("Embedding generation completed: %d/%d successful, %d failed", len(results), len(texts_with_ids), failed_count)
         return results
     
+    def _log_progress(self, completed: int, total: int) -> None:
+        """Log embedding progress at most once per _PROGRESS_LOG_INTERVAL."""
+        now = time.monotonic()
+        if now - self._last_progress_log >= _PROGRESS_LOG_INTERVAL:
+            self._last_progress_log = now
+            logger.info("Embedding progress: %d/%d", completed, total)
+    
     def validate_model_access(self) -> bool:
-        """Validate that we can access the Bedrock model."""
+        """Validate that we can access the Bedrock model.
+        
+        A definitive answer is cached for the client's lifetime; request
+        errors are not, so a transient failure can be retried.
+        """
+        if self._model_validated is not None:
+            return self._model_validated
+        
         try:
             # Try a simple embedding request
-            request_body = {
-                "inputText": "test",
-                "dimensions": self.output_dimensions
-            }
-            
-            response = self.bedrock_runtime.invoke_model(
-                modelId=self.model_id,
-                accept='application/json',
-                contentType='application/json',
-                body=json.dumps(request_body)
-            )
-            
-            response_body = json.loads(response['body'].read())
-            if 'embedding' in response_body and response_body['embedding']:
-                logger.info(f"Model {self.model_id} is available")
-                return True
+            embedding = self._invoke_model("test")
+            if embedding:
+                logger.info("Model %s is available", self.model_id)
+                self._model_validated = True
             else:
-                logger.error(f"Model {self.model_id} did not return valid embedding")
-                return False
+                logger.error("Model %s did not return valid embedding", self.model_id)
+                self._model_validated = False
+            return self._model_validated
                 
         except Exception as e:
-            logger.error(f"Failed to validate model access: {e}")
-            return False
\ No newline at end of file
+            logger.error("Failed to validate model access: %s", e)
+            return False
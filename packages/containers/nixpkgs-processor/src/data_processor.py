@@ -5,8 +5,105 @@ from typing import Any, Dict, List, Optional, Tuple
 
 from dependency_graph import DependencyGraphProcessor
 
+try:
+    import ahocorasick  # type: ignore
+except Exception:  # pragma: no cover - fall back to substring scans
+    ahocorasick = None  # type: ignore
+
 logger = logging.getLogger("fdnix.data-processor")
 
+# nixpkgs meta.category values mapped to user-friendly names
+_CATEGORY_MAP: Dict[str, str] = {
+    "applications.editors": "editors",
+    "applications.graphics": "graphics",
+    "applications.networking": "networking",
+    "applications.science": "science",
+    "applications.system": "system",
+    "applications.virtualization": "virtualization",
+    "applications.audio": "audio",
+    "applications.video": "video",
+    "applications.office": "office",
+    "applications.misc": "applications",
+    "development.tools": "development",
+    "development.libraries": "libraries",
+    "development.compilers": "compilers",
+    "development.interpreters": "interpreters",
+    "development.haskell-modules": "haskell",
+    "development.python-modules": "python",
+    "development.node-packages": "javascript",
+    "development.r-modules": "r",
+    "development.ocaml-modules": "ocaml",
+    "development.perl-modules": "perl",
+    "development.ruby-modules": "ruby",
+    "games": "games",
+    "servers": "servers",
+    "tools.system": "system-tools",
+    "tools.networking": "networking-tools",
+    "tools.text": "text-tools",
+    "tools.misc": "tools",
+    "tools.security": "security",
+    "tools.filesystems": "filesystems",
+    "tools.backup": "backup",
+    "data": "data",
+    "fonts": "fonts",
+    "themes": "themes",
+}
+
+# Attribute-path substrings per category, checked in order (first match wins)
+_PATH_CATEGORY_RULES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    # Language-specific packages
+    ("python", ("python", "python3packages", "python2packages")),
+    ("haskell", ("haskellpackages", "haskell.packages")),
+    ("javascript", ("nodepackages", "node_")),
+    ("r", ("rpackages",)),
+    ("perl", ("perlpackages", "perl5", "perl.")),
+    ("ruby", ("rubypackages", "rubygems")),
+    ("ocaml", ("ocamlpackages", "ocaml-")),
+    ("lua", ("lua", "luapackages")),
+    ("go", ("go-modules", "buildgomodule")),
+    ("rust", ("rustpackages", "cargo")),
+    # Application categories
+    ("editors", ("editor", "vim", "emacs", "nano", "helix")),
+    ("browsers", ("browser", "firefox", "chrome", "webkit")),
+    ("games", ("game", "steam", "lutris")),
+    ("servers", ("server", "nginx", "apache", "httpd", "postgresql", "mysql")),
+    ("fonts", ("font", "fonts", "ttf", "otf")),
+    ("themes", ("theme", "gtk", "qt", "icon")),
+    ("multimedia", ("media", "video", "audio", "vlc", "ffmpeg")),
+    ("office", ("office", "libreoffice", "document")),
+    ("science", ("science", "math", "research", "latex")),
+    ("graphics", ("graphic", "image", "gimp", "inkscape", "photo")),
+    ("networking", ("network", "curl", "wget", "ssh", "tcp")),
+    ("system", ("system", "systemd", "util", "coreutils")),
+    ("security", ("security", "crypto", "ssl", "gpg", "password")),
+    ("backup", ("backup", "rsync", "sync")),
+    ("filesystems", ("filesystem", "fuse", "mount")),
+    ("compilers", ("compiler", "gcc", "clang", "llvm")),
+    ("interpreters", ("interpreter", "runtime")),
+    ("libraries", ("lib", "library", "shared")),
+    ("tools", ("tool", "util", "cli")),
+    ("development", ("devel", "dev", "build", "make", "cmake")),
+)
+
+
+def _build_path_automaton() -> Optional[Any]:
+    """Compile all rule needles into one Aho-Corasick automaton.
+
+    Each needle maps to the index of the first rule containing it.
+    """
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for priority, (_, needles) in enumerate(_PATH_CATEGORY_RULES):
+        for needle in needles:
+            if not automaton.exists(needle):
+                automaton.add_word(needle, priority)
+    automaton.make_automaton()
+    return automaton
+
+
+_PATH_AUTOMATON = _build_path_automaton()
+
 
 class DataProcessor:
     """Processes raw JSONL data from Stage 1 into structured package and dependency data."""
@@ -58,53 +155,50 @@ class DataProcessor:
     def _process_package_data(self, raw_packages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Process package data from nix-eval-jobs output."""
         processed: List[Dict[str, Any]] = []
+        append = processed.append
         current_ts = datetime.now(timezone.utc).isoformat()
+        # Bound once: attribute lookups on self dominate the per-row cost
+        parse_name_version = self._parse_name_version
+        sanitize = self._sanitize_string
+        extract_license_info = self._extract_license_info
+        extract_platforms = self._extract_platforms
+        extract_maintainers = self._extract_maintainers
+        extract_category = self._extract_category
 
         for pkg_data in raw_packages:
             try:
                 # Extract basic info from nix-eval-jobs output
-                attr_path = ".".join(pkg_data.get("attrPath", []))
-                name = pkg_data.get("name", "")
+                attr_path = ".".join(pkg_data.get("attrPath") or ())
                 
                 # Extract package name and version from the name field
-                package_name, version = self._parse_name_version(name)
+                package_name, version = parse_name_version(pkg_data.get("name", ""))
                 if not package_name or package_name == "unknown":
                     logger.debug("Skipping package with unknown name: %s", attr_path)
                     continue
 
-                meta = pkg_data.get("meta", {})
+                meta = pkg_data.get("meta") or {}
+                get = meta.get
+                outputs_to_install = get("outputsToInstall")
 
-                processed.append({
+                append({
                     "packageName": package_name,
                     "version": version,
                     "attributePath": attr_path,
-                    "description": self._sanitize_string(
-                        meta.get("description", "")
-                    ),
-                    "longDescription": self._sanitize_string(
-                        meta.get("longDescription", "")
-                    ),
-                    "homepage": self._sanitize_string(
-                        meta.get("homepage", "")
-                    ),
-                    "license": self._extract_license_info(
-                        meta.get("license")
-                    ),
-                    "platforms": self._extract_platforms(
-                        meta.get("platforms")
-                    ),
-                    "maintainers": self._extract_maintainers(
-                        meta.get("maintainers")
-                    ),
-                    "category": self._extract_category(attr_path, meta),
-                    "broken": bool(meta.get("broken", False)),
-                    "unfree": bool(meta.get("unfree", False)),
-                    "available": meta.get("available") if "available" in meta else True,
-                    "insecure": bool(meta.get("insecure", False)),
-                    "unsupported": bool(meta.get("unsupported", False)),
-                    "mainProgram": self._sanitize_string(meta.get("mainProgram", "")),
-                    "position": self._sanitize_string(meta.get("position", "")),
-                    "outputsToInstall": meta.get("outputsToInstall") if isinstance(meta.get("outputsToInstall"), list) else [],
+                    "description": sanitize(get("description", "")),
+                    "longDescription": sanitize(get("longDescription", "")),
+                    "homepage": sanitize(get("homepage", "")),
+                    "license": extract_license_info(get("license")),
+                    "platforms": extract_platforms(get("platforms")),
+                    "maintainers": extract_maintainers(get("maintainers")),
+                    "category": extract_category(attr_path, meta),
+                    "broken": bool(get("broken", False)),
+                    "unfree": bool(get("unfree", False)),
+                    "available": get("available", True),
+                    "insecure": bool(get("insecure", False)),
+                    "unsupported": bool(get("unsupported", False)),
+                    "mainProgram": sanitize(get("mainProgram", "")),
+                    "position": sanitize(get("position", "")),
+                    "outputsToInstall": outputs_to_install if isinstance(outputs_to_install, list) else [],
                     "lastUpdated": current_ts,
                 })
 
@@ -264,113 +358,21 @@ class DataProcessor:
         if not category:
             return "misc"
             
-        category_str = str(category).lower()
-        
-        # Map common nixpkgs categories to user-friendly names
-        category_map = {
-            "applications.editors": "editors",
-            "applications.graphics": "graphics", 
-            "applications.networking": "networking",
-            "applications.science": "science",
-            "applications.system": "system",
-            "applications.virtualization": "virtualization",
-            "applications.audio": "audio",
-            "applications.video": "video",
-            "applications.office": "office",
-            "applications.misc": "applications",
-            "development.tools": "development",
-            "development.libraries": "libraries",
-            "development.compilers": "compilers",
-            "development.interpreters": "interpreters",
-            "development.haskell-modules": "haskell",
-            "development.python-modules": "python",
-            "development.node-packages": "javascript",
-            "development.r-modules": "r",
-            "development.ocaml-modules": "ocaml",
-            "development.perl-modules": "perl",
-            "development.ruby-modules": "ruby",
-            "games": "games",
-            "servers": "servers",
-            "tools.system": "system-tools",
-            "tools.networking": "networking-tools", 
-            "tools.text": "text-tools",
-            "tools.misc": "tools",
-            "tools.security": "security",
-            "tools.filesystems": "filesystems",
-            "tools.backup": "backup",
-            "data": "data",
-            "fonts": "fonts",
-            "themes": "themes"
-        }
-        
-        return category_map.get(category_str, category_str)
+        category_str = category.lower() if isinstance(category, str) else str(category).lower()
+        return _CATEGORY_MAP.get(category_str, category_str)
 
     def _classify_by_attribute_path(self, pkg_path: str) -> str:
         """Classify package category based on attribute path patterns."""
         path_lower = pkg_path.lower()
         
-        # Language-specific packages
-        if any(x in path_lower for x in ["python", "python3packages", "python2packages"]):
-            return "python"
-        if any(x in path_lower for x in ["haskellpackages", "haskell.packages"]):
-            return "haskell"
-        if "nodepackages" in path_lower or "node_" in path_lower:
-            return "javascript"
-        if "rpackages" in path_lower:
-            return "r"
-        if any(x in path_lower for x in ["perlpackages", "perl5", "perl."]):
-            return "perl"
-        if any(x in path_lower for x in ["rubypackages", "rubygems"]):
-            return "ruby"
-        if any(x in path_lower for x in ["ocamlpackages", "ocaml-"]):
-            return "ocaml"
-        if any(x in path_lower for x in ["lua", "luapackages"]):
-            return "lua"
-        if any(x in path_lower for x in ["go-modules", "buildgomodule"]):
-            return "go"
-        if "rustpackages" in path_lower or "cargo" in path_lower:
-            return "rust"
-            
-        # Application categories  
-        if any(x in path_lower for x in ["editor", "vim", "emacs", "nano", "helix"]):
-            return "editors"
-        if any(x in path_lower for x in ["browser", "firefox", "chrome", "webkit"]):
-            return "browsers"
-        if any(x in path_lower for x in ["game", "steam", "lutris"]):
-            return "games"
-        if any(x in path_lower for x in ["server", "nginx", "apache", "httpd", "postgresql", "mysql"]):
-            return "servers"
-        if any(x in path_lower for x in ["font", "fonts", "ttf", "otf"]):
-            return "fonts"
-        if any(x in path_lower for x in ["theme", "gtk", "qt", "icon"]):
-            return "themes"
-        if any(x in path_lower for x in ["media", "video", "audio", "vlc", "ffmpeg"]):
-            return "multimedia"
-        if any(x in path_lower for x in ["office", "libreoffice", "document"]):
-            return "office"
-        if any(x in path_lower for x in ["science", "math", "research", "latex"]):
-            return "science"
-        if any(x in path_lower for x in ["graphic", "image", "gimp", "inkscape", "photo"]):
-            return "graphics"
-        if any(x in path_lower for x in ["network", "curl", "wget", "ssh", "tcp"]):
-            return "networking"
-        if any(x in path_lower for x in ["system", "systemd", "util", "coreutils"]):
-            return "system"
-        if any(x in path_lower for x in ["security", "crypto", "ssl", "gpg", "password"]):
-            return "security"
-        if any(x in path_lower for x in ["backup", "rsync", "sync"]):
-            return "backup"
-        if any(x in path_lower for x in ["filesystem", "fuse", "mount"]):
-            return "filesystems"
-        if any(x in path_lower for x in ["compiler", "gcc", "clang", "llvm"]):
-            return "compilers"
-        if any(x in path_lower for x in ["interpreter", "runtime"]):
-            return "interpreters"
-        if any(x in path_lower for x in ["lib", "library", "shared"]):
-            return "libraries"
-        if any(x in path_lower for x in ["tool", "util", "cli"]):
-            return "tools"
-        if any(x in path_lower for x in ["devel", "dev", "build", "make", "cmake"]):
-            return "development"
+        if _PATH_AUTOMATON is not None:
+            # One scan over the path; the lowest rule index among all hits is
+            # the rule that would have matched first
+            best = min((priority for _, priority in _PATH_AUTOMATON.iter(path_lower)), default=None)
+            return _PATH_CATEGORY_RULES[best][0] if best is not None else "misc"
+        
+        for category, needles in _PATH_CATEGORY_RULES:
+            if any(x in path_lower for x in needles):
+                return category
         
-        return "misc"
\ No newline at end of file
+        return "misc"
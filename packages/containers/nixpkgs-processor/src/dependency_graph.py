@@ -31,10 +31,14 @@ class DependencyGraph:
         """Build dependency graph from raw JSONL package data."""
         logger.info("Building dependency graph from %d packages...", len(raw_packages))
         
+        # (node_id, inputDrvs) per accepted package, so the edge pass doesn't
+        # re-parse names or re-filter packages
+        edge_sources: List[Tuple[str, Dict[str, Any]]] = []
+        
         # First pass: create vertices and build package mapping
         for pkg_data in raw_packages:
             try:
-                attr_path = ".".join(pkg_data.get("attrPath", []))
+                attr_path = ".".join(pkg_data.get("attrPath") or ())
                 name = pkg_data.get("name", "")
                 package_name, version = self._parse_name_version(name)
                 
@@ -42,6 +46,7 @@ class DependencyGraph:
                     continue
                     
                 node_id = f"{package_name}-{version}"
+                drv_path = pkg_data.get("drvPath", "")
                 
                 # Add vertex with metadata
                 vertex = self.graph.add_vertex()
@@ -51,37 +56,32 @@ class DependencyGraph:
                 self.package_name_prop[vertex] = package_name
                 self.version_prop[vertex] = version
                 self.attr_path_prop[vertex] = attr_path
-                self.drv_path_prop[vertex] = pkg_data.get("drvPath", "")
+                self.drv_path_prop[vertex] = drv_path
                 
                 # Build mappings
                 self.node_id_to_vertex[node_id] = vertex_idx
                 self.vertex_to_node_id[vertex_idx] = node_id
                 
                 # Map store path to vertex index for dependency resolution
-                drv_path = pkg_data.get("drvPath", "")
                 if drv_path:
                     self.package_mapping[drv_path] = vertex_idx
+                
+                input_drvs = pkg_data.get("inputDrvs")
+                if input_drvs:
+                    edge_sources.append((node_id, input_drvs))
                     
             except Exception as e:
                 logger.warning("Error processing package for graph: %s", e)
                 continue
         
         # Second pass: add edges for dependencies
-        for pkg_data in raw_packages:
+        for node_id, input_drvs in edge_sources:
             try:
-                name = pkg_data.get("name", "")
-                package_name, version = self._parse_name_version(name)
-                
-                if not package_name or package_name == "unknown":
-                    continue
-                    
-                node_id = f"{package_name}-{version}"
                 source_vertex_idx = self.node_id_to_vertex.get(node_id)
                 if source_vertex_idx is None:
                     continue
                     
                 # Process input dependencies
-                input_drvs = pkg_data.get("inputDrvs", {})
                 for dep_drv_path in input_drvs.keys():
                     target_vertex_idx = self.package_mapping.get(dep_drv_path)
                     if target_vertex_idx is not None and target_vertex_idx != source_vertex_idx:
@@ -2,9 +2,10 @@
 
 import os
 import sys
+import time
 import logging
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
 from s3_jsonl_reader import S3JsonlReader
 from data_processor import DataProcessor
@@ -14,6 +15,11 @@ from s3_stats_writer import S3StatsWriter
 from layer_publisher import LayerPublisher
 from node_s3_writer import NodeS3Writer
 
+try:
+    import uvloop  # type: ignore
+except Exception:  # pragma: no cover - fall back to the stdlib event loop
+    uvloop = None  # type: ignore
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -27,6 +33,21 @@ def _truthy(val: str | None) -> bool:
     return val.strip().lower() in {"1", "true", "yes", "on"}
 
 
+async def _await_uploads(uploads: List[Tuple[str, "asyncio.Task[None]"]]) -> List[str]:
+    """Wait for background S3 uploads, logging any failure.
+    
+    Returns the names of the uploads that failed.
+    """
+    failed = []
+    for name, task in uploads:
+        try:
+            await task
+        except Exception as exc:
+            logger.error("Upload of the %s failed: %s", name, exc)
+            failed.append(name)
+    return failed
+
+
 def validate_env() -> None:
     """Validate environment variables for Stage 2 (processor)."""
     # Required for reading Stage 1 output
@@ -36,22 +57,17 @@ def validate_env() -> None:
     if missing_basic:
         raise RuntimeError(f"Missing required environment variables: {', '.join(missing_basic)}")
     
-    # Set default keys for outputs if not provided
-    has_data_key = bool(os.environ.get("SQLITE_DATA_KEY"))
-    has_minified_key = bool(os.environ.get("SQLITE_MINIFIED_KEY"))
+    # One timestamp for every defaulted key, so artifacts of a run share it
+    timestamp = int(time.time())
     
-    if not has_data_key or not has_minified_key:
-        import time
-        timestamp = int(time.time())
-        if not has_data_key:
-            os.environ["SQLITE_DATA_KEY"] = f"snapshots/fdnix-data-{timestamp}.db"
-        if not has_minified_key:
-            os.environ["SQLITE_MINIFIED_KEY"] = f"snapshots/fdnix-{timestamp}.db"
+    # Set default keys for outputs if not provided
+    if not os.environ.get("SQLITE_DATA_KEY"):
+        os.environ["SQLITE_DATA_KEY"] = f"snapshots/fdnix-data-{timestamp}.db"
+    if not os.environ.get("SQLITE_MINIFIED_KEY"):
+        os.environ["SQLITE_MINIFIED_KEY"] = f"snapshots/fdnix-{timestamp}.db"
     
     # Set default stats key if not set
     if not os.environ.get("STATS_S3_KEY"):
-        import time
-        timestamp = int(time.time())
         os.environ["STATS_S3_KEY"] = f"stats/fdnix-stats-{timestamp}.json"
     
     # Set default node S3 prefix if not set
@@ -99,7 +115,7 @@ async def main() -> int:
         # Phase 1: Read raw JSONL from Stage 1 (from artifacts bucket)
         logger.info("=== JSONL READING PHASE ===")
         reader = S3JsonlReader(bucket=artifacts_bucket, key=jsonl_input_key, region=region)
-        raw_packages, metadata = reader.read_raw_jsonl()
+        raw_packages, metadata = await asyncio.to_thread(reader.read_raw_jsonl)
         
         if not raw_packages:
             logger.warning("No packages found in JSONL! This may indicate an issue.")
@@ -110,6 +126,9 @@ async def main() -> int:
         # Phase 2: Data Processing (if requested)
         packages = None
         graph_data = None
+        # Background S3 uploads, each awaited (and its error reported) before
+        # main() returns, whether or not the later phases succeed
+        uploads: List[Tuple[str, "asyncio.Task[None]"]] = []
         
         if processing_mode in ("metadata", "both"):
             logger.info("=== DATA PROCESSING PHASE ===")
@@ -122,10 +141,12 @@ async def main() -> int:
             
             if enable_node_s3 or enable_stats:
                 # Use enhanced processing with dependency graph
-                packages, graph_data = processor.process_with_dependency_graph(raw_packages)
+                packages, graph_data = await asyncio.to_thread(
+                    processor.process_with_dependency_graph, raw_packages
+                )
             else:
                 # Use standard processing (original behavior)
-                packages = processor.process_raw_packages(raw_packages)
+                packages = await asyncio.to_thread(processor.process_raw_packages, raw_packages)
             
             # Create main database with metadata only (upload to artifacts bucket)
             main_writer = SQLiteWriter(
@@ -136,7 +157,9 @@ async def main() -> int:
             )
 
             logger.info("Writing metadata to main SQLite artifact...")
-            main_writer.write_artifact(packages)
+            # Blocking phases run in worker threads so independent ones can
+            # overlap: the stats upload only needs graph stats, not the DB.
+            phase_tasks = [asyncio.to_thread(main_writer.write_artifact, packages, upload=False)]
             
             # Write comprehensive stats data to S3 (to processed files bucket)
             if graph_data and os.environ.get("STATS_S3_KEY"):
@@ -152,79 +175,118 @@ async def main() -> int:
                     "total_packages": len(packages)
                 }
                 graph_stats = graph_data.get("graph_stats", {})
-                stats_s3_writer.write_stats_json(graph_stats, stats_metadata)
+                phase_tasks.append(asyncio.to_thread(stats_s3_writer.write_stats_json, graph_stats, stats_metadata))
+            
+            await asyncio.gather(*phase_tasks)
+            if len(phase_tasks) > 1:
                 logger.info("Comprehensive stats data uploaded to S3!")
             
+            # The later phases only read the local main DB, so its upload
+            # runs in the background alongside them
+            uploads.append(("main database", asyncio.create_task(asyncio.to_thread(main_writer.upload))))
+            
             logger.info("Main database generation completed successfully!")
         
         # Note: Embedding generation phase removed - using FTS-only search with SQLite
         # The system now only processes metadata and creates SQLite databases for FTS
 
-        # Phase 4: Minified Database Generation (if requested)
-        if processing_mode in ("minified", "both"):
-            logger.info("=== MINIFIED DATABASE GENERATION PHASE ===")
-            # Use SQLiteWriter's normalized reader to reconstruct licenses/maintainers
-            # from lookup + junction tables and emit the minified artifact.
-            logger.info("Creating minified SQLite database from main database...")
-            minified_builder = SQLiteWriter(
-                output_path=minified_db_path,
-                s3_bucket=artifacts_bucket,
-                s3_key=os.environ.get("SQLITE_MINIFIED_KEY"),
-                region=region,
-            )
-            minified_builder.create_minified_db_from_main(main_db_path)
-            logger.info("Minified SQLite database generation completed successfully!")
-        
-        # Phase 5: Individual Node S3 Writing (if requested and graph data available)
-        enable_node_s3 = _truthy(os.environ.get("ENABLE_NODE_S3", "true"))
-        if enable_node_s3 and packages and graph_data:
-            logger.info("=== INDIVIDUAL NODE S3 WRITING PHASE ===")
+        try:
+            # Phases 4 and 5 are independent (both only read the main DB /
+            # processed packages), so they run concurrently
+            minified_upload = None
             
-            node_s3_prefix = os.environ.get("NODE_S3_PREFIX", "nodes/")
-            node_writer = NodeS3Writer(
-                s3_bucket=processed_files_bucket,
-                s3_prefix=node_s3_prefix,
-                region=region,
-                clear_existing=_truthy(os.environ.get("CLEAR_EXISTING_NODES", "true")),
-                max_workers=int(os.environ.get("NODE_S3_MAX_WORKERS", "10"))
-            )
+            # Phase 4: Minified Database Generation (if requested)
+            async def build_minified_db() -> None:
+                nonlocal minified_upload
+                logger.info("=== MINIFIED DATABASE GENERATION PHASE ===")
+                # Use SQLiteWriter's normalized reader to reconstruct licenses/maintainers
+                # from lookup + junction tables and emit the minified artifact.
+                logger.info("Creating minified SQLite database from main database...")
+                minified_builder = SQLiteWriter(
+                    output_path=minified_db_path,
+                    s3_bucket=artifacts_bucket,
+                    s3_key=os.environ.get("SQLITE_MINIFIED_KEY"),
+                    region=region,
+                )
+                minified_writer = await asyncio.to_thread(
+                    minified_builder.create_minified_db_from_main, main_db_path, upload=False
+                )
+                logger.info("Minified SQLite database generation completed successfully!")
+                # The upload is pure network I/O: let it run in the background
+                # and only wait for it before publishing / finishing
+                minified_upload = asyncio.create_task(asyncio.to_thread(minified_writer.upload))
+                uploads.append(("minified database", minified_upload))
             
-            # Prepare metadata for node files
-            node_metadata = {
-                "extraction_timestamp": metadata.get("extraction_timestamp", "unknown"),
-                "nixpkgs_branch": metadata.get("nixpkgs_branch", "unknown"),
-                "total_packages": len(packages)
-            }
+            # Phase 5: Individual Node S3 Writing (if requested and graph data available)
+            async def write_node_files() -> None:
+                logger.info("=== INDIVIDUAL NODE S3 WRITING PHASE ===")
+                
+                node_s3_prefix = os.environ.get("NODE_S3_PREFIX", "nodes/")
+                node_writer = NodeS3Writer(
+                    s3_bucket=processed_files_bucket,
+                    s3_prefix=node_s3_prefix,
+                    region=region,
+                    clear_existing=_truthy(os.environ.get("CLEAR_EXISTING_NODES", "true")),
+                    max_workers=int(os.environ.get("NODE_S3_MAX_WORKERS", "10"))
+                )
+                
+                # Prepare metadata for node files
+                node_metadata = {
+                    "extraction_timestamp": metadata.get("extraction_timestamp", "unknown"),
+                    "nixpkgs_branch": metadata.get("nixpkgs_branch", "unknown"),
+                    "total_packages": len(packages)
+                }
+                
+                # Write individual node files with dependency information
+                dependency_data = graph_data.get("dependency_data", {})
+                await asyncio.to_thread(node_writer.write_nodes, packages, dependency_data, node_metadata)
+                
+                # Create index file for the frontend (after the nodes: clearing
+                # existing nodes removes everything under the prefix)
+                graph_stats = graph_data.get("graph_stats", {})
+                await asyncio.to_thread(node_writer.create_index_file, packages, graph_stats, node_metadata)
+                
+                # Log final statistics
+                upload_stats = node_writer.get_upload_stats()
+                logger.info("Node S3 writing completed: %d successful, %d errors", 
+                           upload_stats.get('success', 0), upload_stats.get('errors', 0))
             
-            # Write individual node files with dependency information
-            dependency_data = graph_data.get("dependency_data", {})
-            node_writer.write_nodes(packages, dependency_data, node_metadata)
+            phase_tasks = []
+            if processing_mode in ("minified", "both"):
+                phase_tasks.append(build_minified_db())
             
-            # Create index file for the frontend
-            graph_stats = graph_data.get("graph_stats", {})
-            node_writer.create_index_file(packages, graph_stats, node_metadata)
+            enable_node_s3 = _truthy(os.environ.get("ENABLE_NODE_S3", "true"))
+            if enable_node_s3 and packages and graph_data:
+                phase_tasks.append(write_node_files())
+            elif enable_node_s3:
+                logger.info("=== INDIVIDUAL NODE S3 WRITING SKIPPED ===")
+                logger.info("Node S3 writing requested but no graph data available (check ENABLE_NODE_S3 and data processing)")
             
-            # Log final statistics
-            upload_stats = node_writer.get_upload_stats()
-            logger.info("Node S3 writing completed: %d successful, %d errors", 
-                       upload_stats.get('success', 0), upload_stats.get('errors', 0))
-        elif enable_node_s3:
-            logger.info("=== INDIVIDUAL NODE S3 WRITING SKIPPED ===")
-            logger.info("Node S3 writing requested but no graph data available (check ENABLE_NODE_S3 and data processing)")
-        
-        # Phase 6: Publish SQLite layer (if requested)
-        if _truthy(os.environ.get("PUBLISH_LAYER")):
-            logger.info("=== LAYER PUBLISH PHASE ===")
-            layer_arn = os.environ.get("LAYER_ARN", "").strip()
+            await asyncio.gather(*phase_tasks)
             
-            # Use minified key for layer publishing (from artifacts bucket)
-            key = os.environ.get("SQLITE_MINIFIED_KEY", "")
-            if not key:
-                raise RuntimeError("SQLITE_MINIFIED_KEY required for layer publishing")
+            # Phase 6: Publish SQLite layer (if requested)
+            if _truthy(os.environ.get("PUBLISH_LAYER")):
+                logger.info("=== LAYER PUBLISH PHASE ===")
+                layer_arn = os.environ.get("LAYER_ARN", "").strip()
+                
+                # Use minified key for layer publishing (from artifacts bucket)
+                key = os.environ.get("SQLITE_MINIFIED_KEY", "")
+                if not key:
+                    raise RuntimeError("SQLITE_MINIFIED_KEY required for layer publishing")
 
-            publisher = LayerPublisher(region=region)
-            publisher.publish_from_s3(bucket=artifacts_bucket, key=key, layer_arn=layer_arn)
-            logger.info("Layer published using minified SQLite database from key: %s", key)
+                publisher = LayerPublisher(region=region)
+                local_path = None
+                if minified_upload is not None:
+                    await minified_upload
+                    local_path = minified_db_path
+                await asyncio.to_thread(
+                    publisher.publish_from_s3, bucket=artifacts_bucket, key=key, layer_arn=layer_arn, local_path=local_path
+                )
+                logger.info("Layer published using minified SQLite database from key: %s", key)
+        finally:
+            failed_uploads = await _await_uploads(uploads)
+        if failed_uploads:
+            raise RuntimeError("S3 upload failed for: " + ", ".join(failed_uploads))
 
         logger.info("=== STAGE 2 COMPLETED SUCCESSFULLY ===")
         logger.info("Processing completed successfully!")
@@ -236,4 +298,6 @@ async def main() -> int:
 
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        sys.exit(uvloop.run(main()))
     sys.exit(asyncio.run(main()))
@@ -1,7 +1,10 @@
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
+from s3_transfer import s3_client as shared_s3_client, transfer_config, upload_extra_args
+
 try:
     import boto3  # type: ignore
 except Exception:  # pragma: no cover - boto3 may be absent in local-only runs
@@ -10,6 +13,13 @@ except Exception:  # pragma: no cover - boto3 may be absent in local-only runs
 
 logger = logging.getLogger("fdnix.layer-publisher")
 
+# Concurrent Lambda function checks/updates after publishing a layer version
+_LAMBDA_UPDATE_WORKERS = 8
+# Layer ZIPs up to this size are built in memory before spilling to a temp file
+_ZIP_SPOOL_MAX_SIZE = 256 * 1024 * 1024
+# Chunk size when streaming the database into the ZIP entry
+_COPY_BUFFER_SIZE = 1024 * 1024
+
 
 class LayerPublisher:
     """Publishes a new Lambda Layer version from an S3 object.
@@ -23,13 +33,15 @@ class LayerPublisher:
         if not self.region:
             logger.warning("AWS region not provided; falling back to default client config")
 
-    def publish_from_s3(self, *, bucket: str, key: str, layer_arn: str) -> str:
+    def publish_from_s3(self, *, bucket: str, key: str, layer_arn: str, local_path: Optional[str] = None) -> str:
         """Publish a new layer version and return the LayerVersionArn.
 
         Args:
             bucket: S3 bucket containing the SQLite database file
             key: S3 key for the SQLite database file
             layer_arn: Unversioned layer ARN or name (e.g., arn:aws:lambda:...:layer:fdnix-database-layer)
+            local_path: Optional local copy of the database at ``key``; when it exists
+                the S3 download is skipped
         """
         if not boto3:
             raise RuntimeError("boto3 is not available but required for layer publishing")
@@ -40,40 +52,63 @@ class LayerPublisher:
         logger.info("Publishing new layer version from s3://%s/%s to %s", bucket, key, layer_arn)
         
         # Create a ZIP file containing just the SQLite database
+        import shutil
         import tempfile
+        import time
         import zipfile
         from pathlib import Path
         
-        s3_client = boto3.client("s3", region_name=self.region)
+        s3_client = shared_s3_client(self.region)
         lambda_client = boto3.client("lambda", region_name=self.region)
 
         try:
-            # Download the SQLite database file to a temporary directory
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_path = Path(temp_dir)
-                
-                # Download the SQLite database file
-                logger.info("Downloading SQLite database from S3...")
-                local_db_path = temp_path / "fdnix.db"
-                s3_client.download_file(bucket, key, str(local_db_path))
-                logger.debug(f"Downloaded SQLite database to {local_db_path}")
-                
-                # Create ZIP file with the SQLite database in the correct location
-                zip_path = temp_path / "sqlite-layer.zip"
+            # The ZIP is built in a spooled buffer (in memory up to a limit) and
+            # the database is streamed straight into its entry, so neither the
+            # database nor the archive is written out as a separate temp file.
+            with tempfile.SpooledTemporaryFile(max_size=_ZIP_SPOOL_MAX_SIZE) as zip_buffer:
                 logger.info("Creating ZIP file for Lambda layer...")
-                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                # The blobs are already zstd-compressed, so a full deflate pass
+                # mostly burns CPU: default to the fastest level, 0 stores as-is
+                compress_level = int(os.environ.get("LAYER_ZIP_COMPRESSLEVEL", "1"))
+                compression = zipfile.ZIP_DEFLATED if compress_level > 0 else zipfile.ZIP_STORED
+                with zipfile.ZipFile(
+                    zip_buffer, 'w', compression,
+                    compresslevel=min(compress_level, 9) if compression == zipfile.ZIP_DEFLATED else None,
+                ) as zip_file:
                     # Add the SQLite database to the ZIP in the correct location for Lambda
                     # The database should be extracted to /opt/fdnix/fdnix.db in the Lambda layer
                     arc_name = "fdnix.db"
-                    zip_file.write(local_db_path, arc_name)
-                    logger.debug(f"Added {local_db_path} as {arc_name} to ZIP")
+                    with zip_file.open(arc_name, 'w', force_zip64=True) as entry_file:
+                        if local_path and Path(local_path).is_file():
+                            # Same database that was uploaded to the key; no need to fetch it back
+                            logger.info("Using local SQLite database at %s", local_path)
+                            with open(local_path, 'rb') as db_file:
+                                shutil.copyfileobj(db_file, entry_file, _COPY_BUFFER_SIZE)
+                        else:
+                            # Stream the object body straight into the entry: the
+                            # entry is not seekable, so a ranged multipart
+                            # download would only buffer out-of-order parts
+                            logger.info("Streaming SQLite database from S3...")
+                            body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+                            try:
+                                for chunk in body.iter_chunks(_COPY_BUFFER_SIZE):
+                                    entry_file.write(chunk)
+                            finally:
+                                body.close()
+                    # Mode bits live only in the central directory, which is
+                    # written when the archive closes
+                    zip_file.getinfo(arc_name).external_attr = 0o644 << 16
+                    logger.debug("Added %s to ZIP", arc_name)
                 
                 # Upload ZIP to S3 with timestamp to avoid overlap
-                import time
                 timestamp = int(time.time())
                 zip_key = f"{key.rsplit('.', 1)[0]}-{timestamp}.zip"
-                logger.info(f"Uploading ZIP file to s3://{bucket}/{zip_key}")
-                s3_client.upload_file(str(zip_path), bucket, zip_key)
+                logger.info("Uploading ZIP file to s3://%s/%s", bucket, zip_key)
+                zip_size = zip_buffer.tell()
+                zip_buffer.seek(0)
+                s3_client.upload_fileobj(
+                    zip_buffer, bucket, zip_key, ExtraArgs=upload_extra_args(), Config=transfer_config(zip_size)
+                )
                 
                 # Publish layer using the ZIP file
                 resp = lambda_client.publish_layer_version(
@@ -107,53 +142,29 @@ class LayerPublisher:
             layer_name = layer_arn.split(':')[-1] if ':' in layer_arn else layer_arn
             base_layer_arn = ':'.join(layer_arn.split(':')[:-1]) if ':' in layer_arn and layer_arn.count(':') >= 6 else layer_arn
             
-            # List all Lambda functions
+            # List all Lambda functions. Each listed configuration already
+            # carries its layers, so no per-function configuration lookup is
+            # needed; only functions using this layer are updated, concurrently
             paginator = lambda_client.get_paginator('list_functions')
-            functions_updated = 0
-            
+            candidates = []
             for page in paginator.paginate():
                 for function in page.get('Functions', []):
-                    function_name = function['FunctionName']
-                    
-                    try:
-                        # Get function configuration to check layers
-                        config = lambda_client.get_function_configuration(FunctionName=function_name)
-                        layers = config.get('Layers', [])
-                        
-                        # Check if this function uses our layer
-                        updated_layers = []
-                        layer_found = False
-                        
-                        for layer in layers:
-                            layer_version_arn = layer['Arn']
-                            
-                            # Check if this layer matches our layer (by name/base ARN)
-                            if (layer_name in layer_version_arn or 
-                                base_layer_arn in layer_version_arn or
-                                self._layer_arns_match(layer_version_arn, layer_arn)):
-                                
-                                logger.info("Found function %s using layer %s", function_name, layer_version_arn)
-                                updated_layers.append(new_layer_version_arn)
-                                layer_found = True
-                            else:
-                                # Keep other layers unchanged
-                                updated_layers.append(layer_version_arn)
-                        
-                        # Update the function if it uses our layer
-                        if layer_found:
-                            logger.info("Updating function %s to use new layer version %s", function_name, new_layer_version_arn)
-                            
-                            lambda_client.update_function_configuration(
-                                FunctionName=function_name,
-                                Layers=updated_layers
-                            )
-                            
-                            functions_updated += 1
-                            logger.info("Successfully updated function: %s", function_name)
-                    
-                    except Exception as e:
-                        logger.warning("Failed to check/update function %s: %s", function_name, e)
-                        continue
+                    updated_layers = self._replace_layer(
+                        function['FunctionName'], function.get('Layers', []),
+                        layer_name, base_layer_arn, layer_arn, new_layer_version_arn
+                    )
+                    if updated_layers is not None:
+                        candidates.append((function['FunctionName'], updated_layers))
+            
+            functions_updated = 0
+            if candidates:
+                with ThreadPoolExecutor(max_workers=min(_LAMBDA_UPDATE_WORKERS, len(candidates))) as executor:
+                    functions_updated = sum(executor.map(
+                        lambda candidate: self._update_function_layers(
+                            lambda_client, candidate[0], candidate[1], new_layer_version_arn
+                        ),
+                        candidates,
+                    ))
             
             if functions_updated > 0:
                 logger.info("Successfully updated %d Lambda function(s) to use the new layer version", functions_updated)
@@ -164,6 +175,59 @@ class LayerPublisher:
             logger.error("Failed to update Lambda functions using layer: %s", e)
             # Don't raise - this is a nice-to-have feature, not critical
 
+    def _replace_layer(
+        self,
+        function_name: str,
+        layers: list,
+        layer_name: str,
+        base_layer_arn: str,
+        layer_arn: str,
+        new_layer_version_arn: str,
+    ) -> Optional[list]:
+        """Return a function's layer list pointing at the new version, or None if it does not use this layer."""
+        updated_layers = []
+        layer_found = False
+        
+        for layer in layers:
+            layer_version_arn = layer['Arn']
+            
+            # Check if this layer matches our layer (by name/base ARN)
+            if (layer_name in layer_version_arn or 
+                base_layer_arn in layer_version_arn or
+                self._layer_arns_match(layer_version_arn, layer_arn)):
+                
+                logger.info("Found function %s using layer %s", function_name, layer_version_arn)
+                updated_layers.append(new_layer_version_arn)
+                layer_found = True
+            else:
+                # Keep other layers unchanged
+                updated_layers.append(layer_version_arn)
+        
+        return updated_layers if layer_found else None
+
+    def _update_function_layers(
+        self,
+        lambda_client,
+        function_name: str,
+        updated_layers: list,
+        new_layer_version_arn: str,
+    ) -> bool:
+        """Point one function at the new layer version; return whether it was updated."""
+        try:
+            logger.info("Updating function %s to use new layer version %s", function_name, new_layer_version_arn)
+            
+            lambda_client.update_function_configuration(
+                FunctionName=function_name,
+                Layers=updated_layers
+            )
+            
+            logger.info("Successfully updated function: %s", function_name)
+            return True
+        
+        except Exception as e:
+            logger.warning("Failed to update function %s: %s", function_name, e)
+            return False
+
     def _layer_arns_match(self, layer_version_arn: str, target_layer_arn: str) -> bool:
         """Check if two layer ARNs refer to the same layer (ignoring version)."""
         try:
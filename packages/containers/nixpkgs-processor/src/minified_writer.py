@@ -2,15 +2,30 @@
 
 import json
 import logging
+import math
 import os
 import random
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 import zstandard as zstd
 
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - fall back to stdlib json
+    orjson = None  # type: ignore
+
+from s3_transfer import s3_client, transfer_config, upload_extra_args
+
 logger = logging.getLogger("fdnix.minified-writer")
 
+# Bounds for the automatically sized dictionary (zstd's own default is 110 KB)
+_MIN_DICT_SIZE = 4 * 1024
+_MAX_DICT_SIZE = 110 * 1024
+# Packages buffered per executemany batch when building the database
+_INSERT_BATCH_SIZE = 10000
+
 
 class MinifiedWriter:
     def __init__(
@@ -20,8 +35,8 @@ class MinifiedWriter:
         s3_key: Optional[str] = None,
         region: Optional[str] = None,
         clear_before_upload: bool = True,
-        dict_size: int = 65536,
-        sample_count: int = 10000,
+        dict_size: Optional[int] = None,
+        sample_count: Optional[int] = None,
         compression_level: int = 3,
     ) -> None:
         self.output_path = Path(output_path)
@@ -35,13 +50,28 @@ class MinifiedWriter:
         self.sample_count = sample_count
         self.compression_level = compression_level
 
-    def write_artifact(self, packages: List[Dict[str, Any]]) -> None:
-        """Write minified artifact with zstd compression and shared dictionary."""
+    def write_artifact(self, packages: List[Dict[str, Any]], upload: bool = True) -> None:
+        """Write minified artifact with zstd compression and shared dictionary.
+        
+        With upload=False the S3 upload is left to the caller (via
+        upload) so it can overlap with later work.
+        """
         self._ensure_parent_dir()
         
         logger.info("Creating minified SQLite database at %s", self.output_path)
-        logger.info("Using zstd compression: dict_size=%d, sample_count=%d, level=%d", 
-                   self.dict_size, self.sample_count, self.compression_level)
+        logger.info("Using zstd compression: dict_size=%s, sample_count=%s, level=%d", 
+                   self.dict_size or "auto", self.sample_count or "auto", self.compression_level)
+
+        # Deduplicate by package ID in one pass (last one wins, as with the
+        # INSERT OR REPLACE into packages_kv); duplicates would otherwise be
+        # indexed in packages_fts once per copy
+        unique_packages = {self._package_id(p): p for p in packages}
+        if len(unique_packages) != len(packages):
+            logger.info("Dropped %d duplicate packages by package ID", len(packages) - len(unique_packages))
+        # Insert in package_id order: packages_kv's primary-key b-tree is then
+        # filled by appends (no page splits, densely packed pages) and FTS
+        # rowids follow the same order as the keys
+        packages = [unique_packages[package_id] for package_id in sorted(unique_packages)]
 
         # Phase 1: Train compression dictionary
         logger.info("Phase 1: Training compression dictionary...")
@@ -63,24 +93,32 @@ class MinifiedWriter:
         logger.info("Minified SQLite artifact written: %s", self.output_path)
         logger.info("Compression dictionary written: %s", self.dict_output_path)
 
-        if self.s3_bucket and self.s3_key:
-            self._upload_to_s3()
+        if upload and self.s3_bucket and self.s3_key:
+            self.upload()
 
     def _train_dictionary(self, packages: List[Dict[str, Any]]) -> zstd.ZstdCompressionDict:
-        """Train zstd compression dictionary from sample data."""
-        logger.info("Sampling %d packages for dictionary training...", self.sample_count)
+        """Train zstd compression dictionary from sample data.
+        
+        Unless set explicitly, the sample count grows with sqrt(N) and the
+        dictionary size with the sampled bytes (~1/100th, zstd's rule of thumb).
+        """
+        sample_count = self.sample_count
+        if sample_count is None:
+            sample_count = max(2000, 20 * math.isqrt(len(packages)))
+        logger.info("Sampling %d packages for dictionary training...", min(sample_count, len(packages)))
         
         # Sample packages if we have more than the sample count
         sample_packages = packages
-        if len(packages) > self.sample_count:
-            sample_packages = random.sample(packages, self.sample_count)
+        if len(packages) > sample_count:
+            sample_packages = random.sample(packages, sample_count)
+            sample_packages.extend(self._license_coverage_samples(packages, sample_packages))
         
         # Prepare sample bytes
         samples = []
         for i, pkg in enumerate(sample_packages):
             # Create the final JSON object we intend to store
             json_obj = self._create_package_json(pkg)
-            json_bytes = json.dumps(json_obj, separators=(',', ':')).encode('utf-8')
+            json_bytes = self._dumps_compact(json_obj)
             samples.append(json_bytes)
             
             if (i + 1) % 1000 == 0:
@@ -90,15 +128,41 @@ class MinifiedWriter:
         
         # Train the dictionary using zstandard. The function expects the
         # samples as a sequence of bytes-like objects.
-        dictionary = zstd.train_dictionary(self.dict_size, samples)
+        dict_size = self.dict_size
+        if dict_size is None:
+            sample_bytes = sum(len(sample) for sample in samples)
+            dict_size = min(_MAX_DICT_SIZE, max(_MIN_DICT_SIZE, sample_bytes // 100))
+        logger.info("Dictionary size: %d bytes", dict_size)
+        dictionary = zstd.train_dictionary(dict_size, samples)
         
         logger.info("Dictionary trained successfully (size: %d bytes)", len(dictionary))
         return dictionary
 
+    def _license_coverage_samples(
+        self, packages: List[Dict[str, Any]], sampled: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """One extra sample for each license value the random sample missed.
+
+        License objects are long, highly repetitive strings; making sure every
+        distinct one appears in the training set lets the dictionary encode
+        them for all packages, not just those with common licenses.
+        """
+        seen = {self._dumps_compact(pkg.get("license")) for pkg in sampled}
+        extra = []
+        for pkg in packages:
+            key = self._dumps_compact(pkg.get("license"))
+            if key not in seen:
+                seen.add(key)
+                extra.append(pkg)
+        if extra:
+            logger.info("Added %d samples to cover every distinct license", len(extra))
+        return extra
+
     def _build_compressed_database(self, packages: List[Dict[str, Any]], dictionary: zstd.ZstdCompressionDict) -> None:
         """Build SQLite database with compressed data using the trained dictionary."""
-        # Initialize database
-        conn = sqlite3.connect(str(self.output_path))
+        # Initialize database: built in memory (no per-statement journaling or
+        # disk I/O) and written out in a single pass at the end
+        conn = sqlite3.connect(":memory:")
         cursor = conn.cursor()
         
         # Create schema
@@ -112,50 +176,85 @@ class MinifiedWriter:
         
         logger.info("Compressing and inserting package data...")
         
-        # Insert compressed packages
-        for i, pkg in enumerate(packages):
-            package_id = self._package_id(pkg)
-            
-            # Create and compress package JSON
-            json_obj = self._create_package_json(pkg)
-            json_bytes = json.dumps(json_obj, separators=(',', ':')).encode('utf-8')
-            compressed_data = compressor.compress(json_bytes)
+        # Packages are handled in batches: JSON is serialized for the whole
+        # batch, compressed (and verified) across zstd worker threads, then
+        # bulk-inserted with executemany
+        total_input = 0
+        total_compressed = 0
+        for start in range(0, len(packages), _INSERT_BATCH_SIZE):
+            batch = packages[start:start + _INSERT_BATCH_SIZE]
+            package_ids = [self._package_id(pkg) for pkg in batch]
+            json_batch = [self._dumps_compact(self._create_package_json(pkg)) for pkg in batch]
+            compressed_batch = self._compress_batch(compressor, json_batch)
             
             # Verify compression works
-            try:
-                decompressed = decompressor.decompress(compressed_data)
-                assert decompressed == json_bytes, "Decompression verification failed"
-            except Exception as e:
-                logger.error("Compression verification failed for package %s: %s", package_id, e)
-                raise
-            
-            # Insert key-value pair
-            cursor.execute(
-                "INSERT OR REPLACE INTO packages_kv (id, data) VALUES (?, ?)",
-                (package_id, compressed_data)
-            )
+            for package_id, json_bytes, decompressed in zip(
+                package_ids, json_batch, self._decompress_batch(decompressor, compressed_batch)
+            ):
+                if decompressed != json_bytes:
+                    logger.error("Compression verification failed for package %s", package_id)
+                    raise AssertionError("Decompression verification failed")
             
-            # Insert FTS data
-            fts_data = self._extract_fts_data(pkg)
-            cursor.execute(
-                "INSERT OR REPLACE INTO packages_fts (id, name, description) VALUES (?, ?, ?)",
-                (package_id, fts_data['name'], fts_data['description'])
-            )
+            kv_rows = list(zip(package_ids, compressed_batch))
+            fts_rows = []
+            for package_id, pkg in zip(package_ids, batch):
+                fts_data = self._extract_fts_data(pkg)
+                fts_rows.append((package_id, fts_data['name'], fts_data['description']))
+            self._insert_rows(cursor, kv_rows, fts_rows)
             
-            if (i + 1) % 1000 == 0:
-                logger.info("Processed %d/%d packages (compression ratio: %.2f%%)", 
-                           i + 1, len(packages), 
-                           (len(compressed_data) / len(json_bytes)) * 100)
+            total_input += sum(map(len, json_batch))
+            total_compressed += sum(map(len, compressed_batch))
+            logger.info("Processed %d/%d packages (compression ratio: %.2f%%)", 
+                       start + len(batch), len(packages), 
+                       (total_compressed / total_input) * 100 if total_input else 0.0)
         
-        # Commit and optimize
+        # Commit, then write a compacted copy straight to disk: VACUUM INTO
+        # vacuums and saves in one pass, and the temp file is swapped in
+        # atomically once complete
         conn.commit()
-        logger.info("Running VACUUM to optimize database size...")
-        cursor.execute("VACUUM")
-        conn.commit()
-        conn.close()
+        logger.info("Writing compacted database to %s...", self.output_path)
+        compact_path = self.output_path.with_name(self.output_path.name + ".compact")
+        compact_path.unlink(missing_ok=True)
+        try:
+            cursor.execute("VACUUM INTO ?", (str(compact_path),))
+            os.replace(compact_path, self.output_path)
+        except sqlite3.Error as e:
+            logger.warning("VACUUM INTO failed (%s); writing uncompacted database", e)
+            compact_path.unlink(missing_ok=True)
+            disk_conn = sqlite3.connect(str(self.output_path))
+            try:
+                conn.backup(disk_conn)
+            finally:
+                disk_conn.close()
+        finally:
+            conn.close()
         
         logger.info("Compressed database created successfully")
 
+    @staticmethod
+    def _compress_batch(compressor: zstd.ZstdCompressor, items: List[bytes]) -> List[bytes]:
+        """Compress independent frames on all cores (the same frames compress() produces)."""
+        if len(items) > 1 and hasattr(compressor, "multi_compress_to_buffer"):
+            return [segment.tobytes() for segment in compressor.multi_compress_to_buffer(items, threads=-1)]
+        return [compressor.compress(item) for item in items]
+
+    @staticmethod
+    def _decompress_batch(decompressor: zstd.ZstdDecompressor, frames: List[bytes]) -> List[bytes]:
+        """Decompress frames on all cores, for round-trip verification."""
+        if len(frames) > 1 and hasattr(decompressor, "multi_decompress_to_buffer"):
+            return [segment.tobytes() for segment in decompressor.multi_decompress_to_buffer(frames, threads=-1)]
+        return [decompressor.decompress(frame) for frame in frames]
+
+    @staticmethod
+    def _insert_rows(
+        cursor: sqlite3.Cursor, kv_rows: List[Tuple[str, bytes]], fts_rows: List[Tuple[str, str, str]]
+    ) -> None:
+        """Bulk-insert a batch of key-value and FTS rows."""
+        cursor.executemany("INSERT OR REPLACE INTO packages_kv (id, data) VALUES (?, ?)", kv_rows)
+        cursor.executemany(
+            "INSERT OR REPLACE INTO packages_fts (id, name, description) VALUES (?, ?, ?)", fts_rows
+        )
+
     def _create_schema(self, cursor: sqlite3.Cursor) -> None:
         """Create the database schema for compressed storage."""
         # Key-value table for compressed data
@@ -177,8 +276,7 @@ class MinifiedWriter:
             )
         """)
         
-        # Create indexes for performance
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_packages_kv_id ON packages_kv(id)")
+        # No extra index on packages_kv(id): the primary key already covers it
         
         logger.info("Database schema created")
 
@@ -205,9 +303,15 @@ class MinifiedWriter:
             "position": pkg.get("position") or "",
             "outputs_to_install": pkg.get("outputsToInstall"),
             "last_updated": pkg.get("lastUpdated") or "",
-            "content_hash": int(pkg.get("content_hash") or 0)
         }
 
+    @staticmethod
+    def _dumps_compact(data: Any) -> bytes:
+        """Serialize to compact UTF-8 JSON (orjson when available)."""
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
     def _extract_fts_data(self, pkg: Dict[str, Any]) -> Dict[str, str]:
         """Extract data for FTS indexing."""
         return {
@@ -235,7 +339,7 @@ class MinifiedWriter:
         """Ensure parent directory exists."""
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    def _upload_to_s3(self) -> None:
+    def upload(self) -> None:
         """Upload artifacts to S3."""
         try:
             import boto3
@@ -247,18 +351,27 @@ class MinifiedWriter:
             logger.info("S3 upload not configured; skipping.")
             return
         
-        s3 = boto3.client("s3", region_name=self.region)
-        
-        # Upload database
-        logger.info("Uploading minified database to s3://%s/%s", self.s3_bucket, self.s3_key)
-        s3.upload_file(str(self.output_path), self.s3_bucket, self.s3_key)
+        # One client shared by both uploads (boto3 clients are thread-safe)
+        s3 = s3_client(self.region)
         
-        # Upload dictionary
         # Ensure dictionary key uses `.dict` suffix regardless of original
-        from pathlib import Path as _Path
-        dict_key = str(_Path(self.s3_key).with_suffix('.dict'))
-        logger.info("Uploading compression dictionary to s3://%s/%s", self.s3_bucket, dict_key)
-        s3.upload_file(str(self.dict_output_path), self.s3_bucket, dict_key)
+        dict_key = str(Path(self.s3_key).with_suffix('.dict'))
+        uploads = [(self.output_path, self.s3_key), (self.dict_output_path, dict_key)]
+        for local_path, key in uploads:
+            logger.info("Uploading %s to s3://%s/%s", local_path.name, self.s3_bucket, key)
+        
+        # Upload database and dictionary concurrently; result() re-raises failures
+        extra_args = upload_extra_args()
+        with ThreadPoolExecutor(max_workers=len(uploads)) as executor:
+            futures = [
+                executor.submit(
+                    s3.upload_file, str(local_path), self.s3_bucket, key,
+                    ExtraArgs=extra_args, Config=transfer_config(local_path.stat().st_size),
+                )
+                for local_path, key in uploads
+            ]
+            for future in futures:
+                future.result()
         
         logger.info("S3 upload complete")
 
@@ -275,23 +388,26 @@ class MinifiedWriter:
             SELECT package_id, package_name, version, attribute_path, description, 
                    long_description, homepage, license, platforms, maintainers, 
                    category, broken, unfree, available, insecure, unsupported, 
-                   main_program, position, outputs_to_install, last_updated, content_hash
+                   main_program, position, outputs_to_install, last_updated
             FROM packages
         """)
         
         columns = [desc[0] for desc in main_cursor.description]
         packages = []
         
-        for row in main_cursor.fetchall():
-            pkg = dict(zip(columns, row))
-            # Convert JSON strings back to objects
-            for field in ['license', 'platforms', 'maintainers', 'outputs_to_install']:
-                if pkg[field]:
-                    try:
-                        pkg[field] = json.loads(pkg[field])
-                    except (json.JSONDecodeError, TypeError):
-                        pass
-            packages.append(pkg)
+        # Stream rows in batches rather than holding a full fetchall() list
+        # alongside the converted packages
+        for rows in iter(lambda: main_cursor.fetchmany(10000), []):
+            for row in rows:
+                pkg = dict(zip(columns, row))
+                # Convert JSON strings back to objects
+                for field in ['license', 'platforms', 'maintainers', 'outputs_to_install']:
+                    if pkg[field]:
+                        try:
+                            pkg[field] = json.loads(pkg[field])
+                        except (json.JSONDecodeError, TypeError):
+                            pass
+                packages.append(pkg)
         
         main_conn.close()
         
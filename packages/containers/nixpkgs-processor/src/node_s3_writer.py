@@ -1,9 +1,10 @@
+import io
 import json
 import logging
 import brotli
-from typing import Any, Dict, List, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 try:
     import boto3  # type: ignore
@@ -12,8 +13,18 @@ except Exception:  # pragma: no cover
     boto3 = None  # type: ignore
     ClientError = Exception  # type: ignore
 
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - fall back to stdlib json
+    orjson = None  # type: ignore
+
+from s3_transfer import s3_client
+
 logger = logging.getLogger("fdnix.node-s3-writer")
 
+# Shared read-only fallback for packages absent from the dependency graph
+_NO_DEPENDENCY_INFO: Dict[str, Any] = {}
+
 
 class NodeS3Writer:
     """Write individual package nodes as JSON files to S3 for dependency viewer."""
@@ -41,14 +52,13 @@ class NodeS3Writer:
             'errors': 0,
             'total': 0
         }
-        self._stats_lock = threading.Lock()
         
     def _get_s3_client(self):
-        """Get or create S3 client (thread-safe)."""
+        """Get the process-wide pooled S3 client (thread-safe)."""
         if not self._s3_client:
             if boto3 is None:
                 raise RuntimeError("boto3 not available for S3 upload")
-            self._s3_client = boto3.client("s3", region_name=self.region)
+            self._s3_client = s3_client(self.region)
         return self._s3_client
     
     def write_nodes(
@@ -69,33 +79,39 @@ class NodeS3Writer:
         if self.clear_existing:
             self._clear_existing_nodes()
         
-        # Prepare node data
-        nodes_to_write = self._prepare_node_data(packages, dependency_data, metadata)
+        # Longest-processing-time first: nodes with large dependency closures
+        # cost the most to serialize/compress/upload, so start them early and
+        # let the small ones fill in the tail of the pool.
+        packages = sorted(
+            packages,
+            key=lambda pkg: self._dependency_weight(dependency_data.get(
+                f"{pkg.get('packageName', '')}-{pkg.get('version', '')}")),
+            reverse=True,
+        )
+        
+        # Node data is prepared lazily and uploaded batch by batch, so
+        # preparation overlaps with the uploads instead of preceding them
+        self._write_nodes_batch(self._prepare_node_data(packages, dependency_data, metadata))
         
-        if not nodes_to_write:
+        if not self._upload_stats['total']:
             logger.warning("No valid nodes to write after preparation")
             return
         
-        # Write nodes in batches using thread pool
-        self._write_nodes_batch(nodes_to_write)
-        
         # Log final statistics
-        with self._stats_lock:
-            logger.info("Node writing completed: %d successful, %d errors, %d total", 
-                       self._upload_stats['success'], 
-                       self._upload_stats['errors'],
-                       self._upload_stats['total'])
+        logger.info("Node writing completed: %d successful, %d errors, %d total", 
+                   self._upload_stats['success'], 
+                   self._upload_stats['errors'],
+                   self._upload_stats['total'])
     
     def _prepare_node_data(
         self, 
         packages: List[Dict[str, Any]], 
         dependency_data: Dict[str, Any],
         metadata: Optional[Dict[str, Any]] = None
-    ) -> List[Dict[str, Any]]:
-        """Prepare node data by combining package metadata with dependency information."""
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield node data combining package metadata with dependency information."""
         logger.info("Preparing node data with dependency information...")
         
-        nodes = []
         processed_count = 0
         
         for pkg in packages:
@@ -110,7 +126,7 @@ class NodeS3Writer:
                     continue
                 
                 # Get dependency information for this node
-                dep_info = dependency_data.get(node_id, {})
+                dep_info = dependency_data.get(node_id) or _NO_DEPENDENCY_INFO
                 
                 # Create comprehensive node data
                 node_data = {
@@ -138,14 +154,14 @@ class NodeS3Writer:
                     
                     # Dependency information (for dependency viewer)
                     "dependencies": {
-                        "direct": dep_info.get("direct_dependencies", []),
-                        "all": dep_info.get("all_dependencies", []),
+                        "direct": dep_info.get("direct_dependencies") or (),
+                        "all": dep_info.get("all_dependencies") or (),
                         "count": dep_info.get("dependency_count", 0),
                         "totalCount": dep_info.get("total_dependency_count", 0)
                     },
                     "dependents": {
-                        "direct": dep_info.get("direct_dependents", []),
-                        "all": dep_info.get("all_dependents", []),
+                        "direct": dep_info.get("direct_dependents") or (),
+                        "all": dep_info.get("all_dependents") or (),
                         "count": dep_info.get("dependent_count", 0),
                         "totalCount": dep_info.get("total_dependent_count", 0)
                     },
@@ -159,7 +175,7 @@ class NodeS3Writer:
                     }
                 }
                 
-                nodes.append(node_data)
+                yield node_data
                 processed_count += 1
                 
                 if processed_count % 1000 == 0:
@@ -170,41 +186,56 @@ class NodeS3Writer:
                              pkg.get("packageName", "unknown"), e)
                 continue
         
-        logger.info("Prepared %d nodes for S3 upload", len(nodes))
-        return nodes
+        logger.info("Prepared %d nodes for S3 upload", processed_count)
     
-    def _write_nodes_batch(self, nodes: List[Dict[str, Any]]) -> None:
-        """Write nodes to S3 in parallel batches."""
-        with self._stats_lock:
-            self._upload_stats['total'] = len(nodes)
+    def _write_nodes_batch(self, nodes: Iterator[Dict[str, Any]]) -> None:
+        """Write nodes to S3 in parallel batches as they are produced.
         
-        # Split nodes into batches
-        batches = [nodes[i:i + self.batch_size] for i in range(0, len(nodes), self.batch_size)]
+        At most two batches per worker are in flight, which bounds memory
+        while keeping the pool busy. Upload statistics are only updated here,
+        on the calling thread, as batch results are collected; workers just
+        return their counts.
+        """
+        max_in_flight = self.max_workers * 2
+        logger.info("Writing nodes in batches of %d (max %d workers)", 
+                   self.batch_size, self.max_workers)
         
-        logger.info("Writing nodes in %d batches of %d (max %d workers)", 
-                   len(batches), self.batch_size, self.max_workers)
-        
-        # Process batches in parallel
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_batch = {
-                executor.submit(self._write_batch, batch_idx, batch): batch_idx 
-                for batch_idx, batch in enumerate(batches)
-            }
+            future_to_batch: Dict[Any, tuple] = {}
+            batch_idx = 0
             
-            for future in as_completed(future_to_batch):
-                batch_idx = future_to_batch[future]
-                try:
-                    success_count, error_count = future.result()
-                    with self._stats_lock:
+            while True:
+                batch = list(islice(nodes, self.batch_size))
+                if batch:
+                    self._upload_stats['total'] += len(batch)
+                    future = executor.submit(self._write_batch, batch_idx, batch)
+                    future_to_batch[future] = (batch_idx, len(batch))
+                    batch_idx += 1
+                if not future_to_batch:
+                    break
+                if batch and len(future_to_batch) < max_in_flight:
+                    continue
+                
+                done, _ = wait(future_to_batch, return_when=FIRST_COMPLETED)
+                for future in done:
+                    done_idx, batch_len = future_to_batch.pop(future)
+                    try:
+                        success_count, error_count = future.result()
                         self._upload_stats['success'] += success_count
                         self._upload_stats['errors'] += error_count
-                    
-                    logger.debug("Batch %d completed: %d success, %d errors", 
-                               batch_idx, success_count, error_count)
-                except Exception as e:
-                    logger.error("Batch %d failed: %s", batch_idx, e)
-                    with self._stats_lock:
-                        self._upload_stats['errors'] += len(batches[batch_idx])
+                        
+                        logger.debug("Batch %d completed: %d success, %d errors", 
+                                   done_idx, success_count, error_count)
+                    except Exception as e:
+                        logger.error("Batch %d failed: %s", done_idx, e)
+                        self._upload_stats['errors'] += batch_len
+    
+    @staticmethod
+    def _dependency_weight(dep_info: Optional[Dict[str, Any]]) -> int:
+        """Estimate a node's upload cost from its transitive dependency lists."""
+        if not dep_info:
+            return 0
+        return len(dep_info.get("all_dependencies") or ()) + len(dep_info.get("all_dependents") or ())
     
     def _write_batch(self, batch_idx: int, batch: List[Dict[str, Any]]) -> tuple:
         """Write a batch of nodes to S3."""
@@ -220,9 +251,8 @@ class NodeS3Writer:
                 s3_key = f"{self.s3_prefix}{node_id}.json.br"
                 
                 # Convert to compact JSON and compress with brotli
-                json_data = json.dumps(node, separators=(',', ':'), sort_keys=True)
                 compressed_data = brotli.compress(
-                    json_data.encode('utf-8'),
+                    self._dumps_compact(node),
                     quality=self.compression_level
                 )
                 
@@ -251,6 +281,13 @@ class NodeS3Writer:
         
         return success_count, error_count
     
+    @staticmethod
+    def _dumps_compact(data: Any) -> bytes:
+        """Serialize to compact, key-sorted UTF-8 JSON (orjson when available)."""
+        if orjson is not None:
+            return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+        return json.dumps(data, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    
     def _clear_existing_nodes(self) -> None:
         """Clear existing node files from S3 prefix."""
         if not self.clear_existing:
@@ -303,8 +340,7 @@ class NodeS3Writer:
     
     def get_upload_stats(self) -> Dict[str, int]:
         """Get upload statistics."""
-        with self._stats_lock:
-            return self._upload_stats.copy()
+        return self._upload_stats.copy()
     
     def create_index_file(
         self, 
@@ -316,45 +352,51 @@ class NodeS3Writer:
         logger.info("Creating node index file...")
         
         try:
-            # Create index data
-            index_data = {
-                "metadata": {
-                    "generatedAt": metadata.get("extraction_timestamp") if metadata else None,
-                    "nixpkgsBranch": metadata.get("nixpkgs_branch") if metadata else None,
-                    "totalPackages": len(packages),
-                    "s3Bucket": self.s3_bucket,
-                    "s3Prefix": self.s3_prefix,
-                    "generatedBy": "fdnix-nixpkgs-processor"
-                },
-                "dependencyStats": dependency_stats,
-                "packages": [
-                    {
-                        "nodeId": f"{pkg.get('packageName', '')}-{pkg.get('version', '')}",
-                        "packageName": pkg.get("packageName", ""),
-                        "version": pkg.get("version", ""),
-                        "attributePath": pkg.get("attributePath", ""),
-                        "description": pkg.get("description", "")[:200],  # Truncate for index
-                        "category": pkg.get("category", ""),
-                        "broken": pkg.get("broken", False),
-                        "unfree": pkg.get("unfree", False)
-                    }
-                    for pkg in packages
-                ]
+            index_metadata = {
+                "generatedAt": metadata.get("extraction_timestamp") if metadata else None,
+                "nixpkgsBranch": metadata.get("nixpkgs_branch") if metadata else None,
+                "totalPackages": len(packages),
+                "s3Bucket": self.s3_bucket,
+                "s3Prefix": self.s3_prefix,
+                "generatedBy": "fdnix-nixpkgs-processor"
             }
             
+            # Stream the index through brotli entry by entry instead of building
+            # the full document (and its serialized copy) in memory. Top-level
+            # keys are emitted in sorted order to match the per-node files.
+            compressor = brotli.Compressor(quality=self.compression_level)
+            compressed = io.BytesIO()
+            dumps = self._dumps_compact
+            compressed.write(compressor.process(
+                b'{"dependencyStats":' + dumps(dependency_stats)
+                + b',"metadata":' + dumps(index_metadata)
+                + b',"packages":['
+            ))
+            separator = b''
+            for pkg in packages:
+                entry = {
+                    "nodeId": f"{pkg.get('packageName', '')}-{pkg.get('version', '')}",
+                    "packageName": pkg.get("packageName", ""),
+                    "version": pkg.get("version", ""),
+                    "attributePath": pkg.get("attributePath", ""),
+                    "description": pkg.get("description", "")[:200],  # Truncate for index
+                    "category": pkg.get("category", ""),
+                    "broken": pkg.get("broken", False),
+                    "unfree": pkg.get("unfree", False)
+                }
+                compressed.write(compressor.process(separator + dumps(entry)))
+                separator = b','
+            compressed.write(compressor.process(b']}'))
+            compressed.write(compressor.finish())
+            
             # Upload index file with brotli compression
             s3_client = self._get_s3_client()
             index_key = f"{self.s3_prefix}index.json.br"
-            json_data = json.dumps(index_data, separators=(',', ':'), sort_keys=True)
-            compressed_data = brotli.compress(
-                json_data.encode('utf-8'),
-                quality=self.compression_level
-            )
             
             s3_client.put_object(
                 Bucket=self.s3_bucket,
                 Key=index_key,
-                Body=compressed_data,
+                Body=compressed.getvalue(),
                 ContentType='application/json',
                 ContentEncoding='br',
                 Metadata={
@@ -10,6 +10,13 @@ except ImportError:
     boto3 = None
     brotli = None
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - fall back to stdlib json
+    orjson = None  # type: ignore
+
+from s3_transfer import s3_client
+
 logger = logging.getLogger("fdnix.s3-jsonl-reader")
 
 
@@ -25,7 +32,7 @@ class S3JsonlReader:
         self.bucket = bucket
         self.key = key
         self.region = region
-        self.s3_client = boto3.client('s3', region_name=region)
+        self.s3_client = s3_client(region)
         
     def read_raw_jsonl(self) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """Read raw package data from brotli-compressed S3 JSONL file.
@@ -57,13 +64,14 @@ class S3JsonlReader:
             # First line should be metadata
             metadata = {}
             raw_packages = []
+            loads = orjson.loads if orjson else json.loads
             
             for line_num, line in enumerate(lines, 1):
                 if not line.strip():
                     continue
                 
                 try:
-                    data = json.loads(line)
+                    data = loads(line)
                     
                     # Check if this is metadata (first line)
                     if line_num == 1 and "_metadata" in data:
@@ -8,6 +8,8 @@ try:
 except Exception:  # pragma: no cover
     boto3 = None  # type: ignore
 
+from s3_transfer import s3_client
+
 logger = logging.getLogger("fdnix.s3-stats-writer")
 
 
@@ -58,7 +60,7 @@ class S3StatsWriter:
         stats_key = self.s3_key if self.s3_key.endswith('.br') else f"{self.s3_key}.br"
         
         # Upload to S3 with appropriate content encoding
-        s3 = boto3.client("s3", region_name=self.region)
+        s3 = s3_client(self.region)
         s3.put_object(
             Bucket=self.s3_bucket,
             Key=stats_key,
@@ -0,0 +1,100 @@
+import os
+import threading
+from typing import Any, Dict, Optional
+
+try:
+    import boto3  # type: ignore
+    from boto3.s3.transfer import TransferConfig  # type: ignore
+    from botocore.config import Config  # type: ignore
+except Exception:  # pragma: no cover - boto3 may be absent in local-only runs
+    boto3 = None  # type: ignore
+    TransferConfig = None  # type: ignore
+    Config = None  # type: ignore
+
+try:
+    import awscrt  # type: ignore  # noqa: F401 - native CRC32C and CRT transfers
+except Exception:  # pragma: no cover - CRC32C falls back to botocore defaults
+    awscrt = None  # type: ignore
+
+
+_MB = 1024 * 1024
+# Smallest part size S3 accepts for all but the last part of a multipart upload
+_MIN_PART_SIZE = 5 * _MB
+
+# One S3 client per region for the whole process (boto3 clients are
+# thread-safe once created; creation itself is not, hence the lock)
+_clients: Dict[Optional[str], Any] = {}
+_clients_lock = threading.Lock()
+
+
+def s3_client(region: Optional[str] = None) -> Any:
+    """Return the shared, long-lived S3 client for a region.
+
+    The client has a connection pool large enough for the writers' worker
+    threads, TCP keepalive, and adaptive retries for S3 throttling, so
+    connections (and TLS sessions) are reused across every upload/download.
+    """
+    if boto3 is None:
+        raise RuntimeError("boto3 is not available")
+    with _clients_lock:
+        client = _clients.get(region)
+        if client is None:
+            client = boto3.client(
+                "s3",
+                region_name=region,
+                config=Config(
+                    max_pool_connections=64,
+                    retries={"max_attempts": 10, "mode": "adaptive"},
+                    tcp_keepalive=True,
+                ),
+            )
+            _clients[region] = client
+        return client
+
+
+def transfer_config(size: Optional[int] = None) -> Optional[Any]:
+    """Build the multipart TransferConfig shared by upload_file/download_file calls.
+
+    Objects above 8 MB are split into parts transferred in parallel; the
+    number of concurrent parts per object comes from S3_PART_CONCURRENCY.
+    Parts are 16 MB, or, when the object size is known, sized so every
+    worker gets a part (between S3's 5 MB minimum and 64 MB).
+    Returns None (boto3 defaults) when boto3 is unavailable.
+    """
+    if TransferConfig is None:
+        return None
+    concurrency = max(1, int(os.environ.get("S3_PART_CONCURRENCY", "16")))
+    chunksize = 16 * _MB
+    if size is not None:
+        per_worker = -(-size // concurrency)
+        chunksize = min(64 * _MB, max(_MIN_PART_SIZE, -(-per_worker // _MB) * _MB))
+    settings = dict(
+        multipart_threshold=8 * _MB,
+        multipart_chunksize=chunksize,
+        max_concurrency=concurrency,
+        use_threads=True,
+    )
+    # The CRT transfer manager (S3_TRANSFER_CLIENT=crt, needs awscrt) runs its
+    # multipart scheduler outside the GIL but is opt-in; by default the
+    # classic threaded manager applies the settings above. Older boto3
+    # releases without preferred_transfer_client ignore the override.
+    transfer_client = os.environ.get("S3_TRANSFER_CLIENT")
+    if transfer_client:
+        try:
+            return TransferConfig(preferred_transfer_client=transfer_client, **settings)
+        except TypeError:
+            pass
+    return TransferConfig(**settings)
+
+
+def upload_extra_args() -> Dict[str, str]:
+    """ExtraArgs for artifact uploads: per-part CRC32C checksums.
+
+    CRC32C is hardware-accelerated through awscrt; without it botocore's
+    default checksum is left in place. S3_CHECKSUM_ALGORITHM overrides the
+    choice (an empty value disables the explicit checksum).
+    """
+    algorithm = os.environ.get("S3_CHECKSUM_ALGORITHM")
+    if algorithm is None:
+        algorithm = "CRC32C" if awscrt is not None else ""
+    return {"ChecksumAlgorithm": algorithm} if algorithm else {}
@@ -1,15 +1,14 @@
 #!/usr/bin/env python3
 
+import hashlib
 import json
 import logging
 import os
 import shutil
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import sqlite3
-import pandas as pd
-from pydantic import BaseModel
 import zstandard as zstd
 
 try:
@@ -17,6 +16,13 @@ try:
 except Exception:  # pragma: no cover - boto3 may be absent in local-only runs
     boto3 = None  # type: ignore
 
+from s3_transfer import s3_client, transfer_config, upload_extra_args
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - fall back to stdlib json
+    orjson = None  # type: ignore
+
 try:
     from minified_writer import MinifiedWriter
 except ImportError:
@@ -25,6 +31,39 @@ except ImportError:
 
 logger = logging.getLogger("fdnix.sqlite-writer")
 
+# packages table columns, in the order of the tuples built for insertion
+_PACKAGE_COLUMNS = (
+    "package_id", "package_name", "version", "attribute_path", "description",
+    "long_description", "search_text", "homepage", "category", "broken", "unfree",
+    "available", "insecure", "unsupported", "main_program", "position",
+    "outputs_to_install", "last_updated", "content_hash",
+)
+# Built once from _PACKAGE_COLUMNS rather than per insert batch
+_UPSERT_PACKAGES_SQL = (
+    f"INSERT INTO packages ({', '.join(_PACKAGE_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(_PACKAGE_COLUMNS))}) "
+    "ON CONFLICT(package_id) DO UPDATE SET "
+    + ", ".join(f"{column} = excluded.{column}" for column in _PACKAGE_COLUMNS[1:])
+)
+# Rows per fetchmany() when streaming query results out of a database
+_FETCH_BATCH_SIZE = 10000
+
+# Indexes duplicating a UNIQUE constraint or primary-key prefix; dropped if present
+_REDUNDANT_INDEXES = (
+    "idx_license_short_name",
+    "idx_architecture_name",
+    "idx_maintainer_name",
+    "idx_package_licenses_package_id",
+    "idx_package_architectures_package_id",
+    "idx_package_maintainers_package_id",
+    "idx_variations_package_id",
+)
+# Substrings identifying a trailing system component in an attribute path
+_SYSTEM_MARKERS = ("linux", "darwin", "windows")
+# Variant merge rules: first non-empty value wins / logical OR across variants
+_FIRST_NON_EMPTY_FIELDS = ("description", "longDescription", "homepage", "category", "mainProgram")
+_ANY_TRUE_FIELDS = ("broken", "unfree", "insecure", "unsupported")
+
 
 class SQLiteWriter:
     def __init__(
@@ -42,13 +81,17 @@ class SQLiteWriter:
         self.clear_before_upload = clear_before_upload
         self._db_connection = None
 
-    def write_artifact(self, packages: List[Dict[str, Any]]) -> None:
+    def write_artifact(self, packages: List[Dict[str, Any]], upload: bool = True) -> None:
+        """Write the normalized database; with upload=False the S3 upload is
+        left to the caller (via upload) so it can overlap with later work.
+        """
         self._ensure_parent_dir()
         logger.info("Creating normalized SQLite database at %s", self.output_path)
 
         # Connect to SQLite database
         self._db_connection = sqlite3.connect(str(self.output_path))
         cursor = self._db_connection.cursor()
+        self._configure_build_pragmas(cursor)
         
         # Create normalized tables
         self._create_tables(cursor)
@@ -67,17 +110,38 @@ class SQLiteWriter:
 
         logger.info("Normalized SQLite artifact written: %s", self.output_path)
 
-        if self.s3_bucket and self.s3_key:
-            self._upload_to_s3()
-        
         # Close connection
         if self._db_connection:
             self._db_connection.close()
             self._db_connection = None
 
+        if upload and self.s3_bucket and self.s3_key:
+            self.upload()
+
     def _ensure_parent_dir(self) -> None:
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
 
+    def _configure_build_pragmas(self, cursor: sqlite3.Cursor) -> None:
+        """Tune the connection for the bulk build: sorter threads for index
+        creation, a larger page cache, and temp b-trees kept in memory.
+        """
+        threads = int(os.environ.get("SQLITE_THREADS") or os.cpu_count() or 1)
+        cache_mb = int(os.environ.get("SQLITE_CACHE_MB", "256"))
+        cursor.execute(f"PRAGMA threads = {max(0, threads)}")
+        cursor.execute(f"PRAGMA cache_size = {-1024 * max(1, cache_mb)}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+
+    def _connect_readonly(self, db_path: str) -> sqlite3.Connection:
+        """Open an existing database read-only (URI mode=ro) with the build
+        pragmas plus memory-mapped reads, for the extraction scans.
+        """
+        conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+        cursor = conn.cursor()
+        self._configure_build_pragmas(cursor)
+        cursor.execute(f"PRAGMA mmap_size = {1024 * 1024 * int(os.environ.get('SQLITE_CACHE_MB', '256'))}")
+        cursor.execute("PRAGMA query_only = ON")
+        return conn
+
     def _create_tables(self, cursor: sqlite3.Cursor) -> None:
         """Create normalized database tables"""
         # Create lookup tables
@@ -205,7 +269,17 @@ class SQLiteWriter:
 
     def _create_fts_table(self, cursor: sqlite3.Cursor) -> None:
         """Create FTS virtual table for full-text search"""
+        # Check for FTS5 up front, before any existing index is cleared, rather
+        # than failing part-way through the rebuild
+        if not self._fts5_available(cursor):
+            logger.error("SQLite build lacks FTS5; skipping FTS table creation")
+            return
+        
         try:
+            fts_existed = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'packages_fts'"
+            ).fetchone() is not None
+            
             # Create FTS virtual table with contentless mode
             cursor.execute("""
                 CREATE VIRTUAL TABLE IF NOT EXISTS packages_fts USING fts5(
@@ -220,17 +294,76 @@ class SQLiteWriter:
                 )
             """)
             
-            # Populate FTS table with minimal search content
+            # Skip the (tokenizing) rebuild when the indexed columns are
+            # unchanged since the last build recorded in index_meta. Fresh
+            # databases have no index to reuse, so they skip the signature
+            # scan entirely.
             cursor.execute("""
+                CREATE TABLE IF NOT EXISTS index_meta (
+                    name TEXT PRIMARY KEY,
+                    signature TEXT NOT NULL,
+                    built_at TEXT
+                )
+            """)
+            signature = None
+            row = cursor.execute("SELECT signature FROM index_meta WHERE name = 'packages_fts'").fetchone()
+            if row is not None:
+                signature = self._fts_source_signature(cursor)
+                if row[0] == signature:
+                    logger.info("FTS index is up to date (%s); skipping rebuild", signature)
+                    return
+            
+            # Populate FTS table with minimal search content, replacing any
+            # entries from a previous build
+            cursor.execute("INSERT INTO packages_fts(packages_fts) VALUES('delete-all')")
+            fts_rows = cursor.execute("""
                 INSERT INTO packages_fts(package_id, package_name, attribute_path, description, long_description, main_program)
                 SELECT package_id, package_name, attribute_path, description, long_description, main_program
                 FROM packages
-            """)
+                ORDER BY package_id
+            """).rowcount
+            # Merge the segment b-trees produced by the bulk insert into one
+            cursor.execute("INSERT INTO packages_fts(packages_fts) VALUES('optimize')")
+            # An existing database rebuilt in place records its first
+            # signature so later reruns can be skipped
+            if signature is None and fts_existed:
+                signature = self._fts_source_signature(cursor)
+            if signature is not None:
+                cursor.execute("""
+                    INSERT INTO index_meta (name, signature, built_at) VALUES ('packages_fts', ?, datetime('now'))
+                    ON CONFLICT(name) DO UPDATE SET signature = excluded.signature, built_at = excluded.built_at
+                """, (signature,))
             
-            logger.info("FTS virtual table created and populated")
+            logger.info("FTS virtual table created and populated with %d rows", fts_rows)
         except Exception as e:
             logger.error("Failed to create FTS table: %s", e)
 
+    @staticmethod
+    def _fts5_available(cursor: sqlite3.Cursor) -> bool:
+        """Probe for the FTS5 module with a throwaway temp table."""
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.fts5_probe")
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def _fts_source_signature(self, cursor: sqlite3.Cursor) -> str:
+        """Row count plus a digest of every FTS-indexed column, in insertion order."""
+        digest = hashlib.blake2b(digest_size=16)
+        count = 0
+        # Each row's separated columns are concatenated by SQLite, so the
+        # scan yields one string per row rather than a tuple to join
+        for (text,) in cursor.execute("""
+            SELECT ifnull(package_id, '') || char(31) || ifnull(package_name, '') || char(31)
+                || ifnull(attribute_path, '') || char(31) || ifnull(description, '') || char(31)
+                || ifnull(long_description, '') || char(31) || ifnull(main_program, '') || char(30)
+            FROM packages
+        """):
+            digest.update(text.encode("utf-8", "surrogatepass"))
+            count += 1
+        return f"{count}:{digest.hexdigest()}"
+
     def _create_indexes(self, cursor: sqlite3.Cursor) -> None:
         """Create indexes for performance optimization"""
         
@@ -256,44 +389,34 @@ class SQLiteWriter:
         self._create_normalized_indexes(cursor)
 
     def _create_normalized_indexes(self, cursor: sqlite3.Cursor) -> None:
-        """Create indexes for normalized tables"""
-        
-        # Index on license short name
-        try:
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_license_short_name ON licenses(short_name)")
-        except Exception as e:
-            logger.warning("Failed to create license_short_name index: %s", e)
-        
-        # Index on architecture name
-        try:
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_architecture_name ON architectures(name)")
-        except Exception as e:
-            logger.warning("Failed to create architecture_name index: %s", e)
-        
-        # Index on maintainer name/email/github
+        """Create indexes for normalized tables.
+        
+        Lookups already covered by a UNIQUE constraint or by the leading
+        column of a primary key (license/architecture names, maintainer name,
+        package_id on the junction and variations tables) get no separate
+        index; any left over from older builds are dropped so inserts stop
+        maintaining them.
+        """
+        for index_name in _REDUNDANT_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+        
+        # Index on maintainer email/github (name is the leading column of the UNIQUE key)
         try:
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_maintainer_name ON maintainers(name)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_maintainer_email ON maintainers(email)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_maintainer_github ON maintainers(github)")
         except Exception as e:
             logger.warning("Failed to create maintainer indexes: %s", e)
         
-        # Indexes for junction tables
+        # Reverse lookups on junction tables (package_id leads their primary keys)
         try:
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_package_licenses_package_id ON package_licenses(package_id)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_package_licenses_license_id ON package_licenses(license_id)")
-            
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_package_architectures_package_id ON package_architectures(package_id)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_package_architectures_arch_id ON package_architectures(arch_id)")
-            
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_package_maintainers_package_id ON package_maintainers(package_id)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_package_maintainers_maintainer_id ON package_maintainers(maintainer_id)")
         except Exception as e:
             logger.warning("Failed to create junction table indexes: %s", e)
         
         # Index for variations table
         try:
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_variations_package_id ON package_variations(package_id)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_variations_system ON package_variations(system)")
         except Exception as e:
             logger.warning("Failed to create variations table indexes: %s", e)
@@ -306,9 +429,7 @@ class SQLiteWriter:
         cursor = self._db_connection.cursor()
         
         # Extract unique values for normalization (from all packages before deduplication)
-        licenses_data = self._extract_licenses(packages)
-        architectures_data = self._extract_architectures(packages)
-        maintainers_data = self._extract_maintainers(packages)
+        licenses_data, architectures_data, maintainers_data = self._extract_lookup_values(packages)
         
         # Insert lookup table data
         self._insert_lookup_data(cursor, licenses_data, architectures_data, maintainers_data)
@@ -327,28 +448,30 @@ class SQLiteWriter:
         if not packages:
             return []
             
-        # Group packages by their base package ID
-        package_groups = {}
+        # Single pass keyed by base package ID: the first variant is stored
+        # directly; only IDs that actually collide get a variants list.
+        first_variants: Dict[str, Dict[str, Any]] = {}
+        duplicates: Dict[str, List[Dict[str, Any]]] = {}
         
         for p in packages:
             pkg_id = self._package_id(p)
-            if pkg_id not in package_groups:
-                package_groups[pkg_id] = []
-            package_groups[pkg_id].append(p)
-        
-        deduplicated_packages = []
-        
-        for pkg_id, variants in package_groups.items():
-            if len(variants) == 1:
-                # No deduplication needed
-                deduplicated_packages.append(variants[0])
+            first = first_variants.setdefault(pkg_id, p)
+            if first is p:
                 continue
-            
-            # Merge variants
-            merged_pkg = self._merge_package_variants(variants)
-            deduplicated_packages.append(merged_pkg)
+            variants = duplicates.get(pkg_id)
+            if variants is None:
+                duplicates[pkg_id] = [first, p]
+            else:
+                variants.append(p)
         
-        return deduplicated_packages
+        if not duplicates:
+            return list(first_variants.values())
+        
+        # Merge variants, preserving first-seen order
+        return [
+            self._merge_package_variants(duplicates[pkg_id]) if pkg_id in duplicates else pkg
+            for pkg_id, pkg in first_variants.items()
+        ]
     
     def _merge_package_variants(self, variants: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Merge multiple package variants into one unified package."""
@@ -363,7 +486,7 @@ class SQLiteWriter:
         # Merge architectures (union of all)
         all_architectures = set()
         for variant in variants:
-            platforms = variant.get("platforms", [])
+            platforms = variant.get("platforms")
             if isinstance(platforms, list):
                 for platform in platforms:
                     if isinstance(platform, str):
@@ -373,7 +496,7 @@ class SQLiteWriter:
         # Merge maintainers (union of all, unique by key)
         all_maintainers = {}
         for variant in variants:
-            maintainers = variant.get("maintainers", [])
+            maintainers = variant.get("maintainers")
             if isinstance(maintainers, list):
                 for maintainer in maintainers:
                     if isinstance(maintainer, dict):
@@ -394,8 +517,7 @@ class SQLiteWriter:
         
         # Merge other appropriate fields
         # Use first non-null value for most fields
-        fields_to_merge = ["description", "longDescription", "homepage", "category", "mainProgram"]
-        for field in fields_to_merge:
+        for field in _FIRST_NON_EMPTY_FIELDS:
             if not merged.get(field):
                 for variant in variants:
                     if variant.get(field):
@@ -403,8 +525,7 @@ class SQLiteWriter:
                         break
         
         # Boolean fields: logical OR (if any variant is broken, package is broken)
-        bool_fields = ["broken", "unfree", "insecure", "unsupported"]
-        for field in bool_fields:
+        for field in _ANY_TRUE_FIELDS:
             for variant in variants:
                 if variant.get(field, False):
                     merged[field] = True
@@ -415,72 +536,58 @@ class SQLiteWriter:
         
         return merged
 
-    def _extract_licenses(self, packages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Extract unique license information from all packages."""
+    def _extract_lookup_values(
+        self, packages: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[str], List[Dict[str, Any]]]:
+        """Extract unique licenses, architecture names and maintainers in one pass over all packages."""
         licenses = {}
-        
-        for p in packages:
-            license_info = p.get("license")
-            if not license_info:
-                continue
-                
-            if isinstance(license_info, dict):
-                if license_info.get("type") == "array":
-                    for lic in license_info.get("licenses", []):
-                        if lic and lic.get("shortName"):
-                            licenses[lic["shortName"]] = lic
-                elif license_info.get("shortName"):
-                    licenses[license_info["shortName"]] = license_info
-            elif isinstance(license_info, str):
-                licenses[license_info] = {"shortName": license_info, "fullName": "", "spdxId": "", "url": ""}
-        
-        return list(licenses.values())
-
-    def _extract_architectures(self, packages: List[Dict[str, Any]]) -> List[str]:
-        """Extract unique architecture names from all packages."""
         architectures = set()
+        maintainers = {}
+        maintainer_id = 1
         
         for p in packages:
-            platforms = p.get("platforms", [])
+            license_info = p.get("license")
+            if license_info:
+                if isinstance(license_info, dict):
+                    if license_info.get("type") == "array":
+                        for lic in license_info.get("licenses") or ():
+                            if lic and lic.get("shortName"):
+                                licenses[lic["shortName"]] = lic
+                    elif license_info.get("shortName"):
+                        licenses[license_info["shortName"]] = license_info
+                elif isinstance(license_info, str):
+                    licenses[license_info] = {"shortName": license_info, "fullName": "", "spdxId": "", "url": ""}
+            
+            platforms = p.get("platforms")
             if isinstance(platforms, list):
                 for platform in platforms:
                     if isinstance(platform, str):
                         architectures.add(platform)
-        
-        return sorted(list(architectures))
-
-    def _extract_maintainers(self, packages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Extract unique maintainer information from all packages."""
-        maintainers = {}
-        maintainer_id = 1
-        
-        for p in packages:
-            package_maintainers = p.get("maintainers", [])
-            if not isinstance(package_maintainers, list):
-                continue
-                
-            for maintainer in package_maintainers:
-                if not isinstance(maintainer, dict):
-                    continue
+            
+            package_maintainers = p.get("maintainers")
+            if isinstance(package_maintainers, list):
+                for maintainer in package_maintainers:
+                    if not isinstance(maintainer, dict):
+                        continue
+                        
+                    # Create unique key for maintainer
+                    key = (
+                        maintainer.get("name", ""),
+                        maintainer.get("email", ""), 
+                        maintainer.get("github", "")
+                    )
                     
-                # Create unique key for maintainer
-                key = (
-                    maintainer.get("name", ""),
-                    maintainer.get("email", ""), 
-                    maintainer.get("github", "")
-                )
-                
-                if key not in maintainers and any(key):
-                    maintainers[key] = {
-                        "maintainer_id": maintainer_id,
-                        "name": maintainer.get("name", ""),
-                        "email": maintainer.get("email", ""),
-                        "github": maintainer.get("github", ""),
-                        "github_id": maintainer.get("githubId")
-                    }
-                    maintainer_id += 1
-        
-        return list(maintainers.values())
+                    if key not in maintainers and any(key):
+                        maintainers[key] = {
+                            "maintainer_id": maintainer_id,
+                            "name": maintainer.get("name", ""),
+                            "email": maintainer.get("email", ""),
+                            "github": maintainer.get("github", ""),
+                            "github_id": maintainer.get("githubId")
+                        }
+                        maintainer_id += 1
+        
+        return list(licenses.values()), sorted(architectures), list(maintainers.values())
 
     def _insert_lookup_data(self, cursor: sqlite3.Cursor, licenses: List[Dict[str, Any]], 
                            architectures: List[str], maintainers: List[Dict[str, Any]]) -> None:
@@ -529,7 +636,47 @@ class SQLiteWriter:
             logger.info("Inserted %d unique maintainers", len(maintainer_tuples))
 
     def _insert_packages_and_relationships(self, cursor: sqlite3.Cursor, packages: List[Dict[str, Any]]) -> None:
-        """Insert packages and their relationships to lookup tables."""
+        """Insert packages and their relationships to lookup tables.
+        
+        Rows are built and inserted in chunks of SQLITE_INSERT_BATCH packages,
+        so only one chunk's parameter tuples are held in memory at a time.
+        """
+        # Rows already present with the same content hash (re-runs against an
+        # existing database) are left untouched
+        existing_hashes = dict(cursor.execute("SELECT package_id, content_hash FROM packages"))
+        
+        # The lookup tables are small: resolve relationship IDs from in-memory
+        # dicts instead of a lookup subquery per inserted relationship
+        license_ids = dict(cursor.execute("SELECT short_name, license_id FROM licenses"))
+        arch_ids = dict(cursor.execute("SELECT name, arch_id FROM architectures"))
+        maintainer_ids = {
+            (name, email, github): maintainer_id
+            for name, email, github, maintainer_id in cursor.execute(
+                "SELECT name, email, github, maintainer_id FROM maintainers"
+            )
+        }
+        lookup_ids = (license_ids, arch_ids, maintainer_ids)
+        
+        batch_size = max(1, int(os.environ.get("SQLITE_INSERT_BATCH", "50000")))
+        unchanged = 0
+        for start in range(0, len(packages), batch_size):
+            unchanged += self._insert_package_batch(
+                cursor, packages[start:start + batch_size], existing_hashes, lookup_ids
+            )
+        
+        if unchanged:
+            logger.info("Skipped %d unchanged packages (matching content hash)", unchanged)
+
+    def _insert_package_batch(
+        self,
+        cursor: sqlite3.Cursor,
+        packages: List[Dict[str, Any]],
+        existing_hashes: Dict[str, int],
+        lookup_ids: Tuple[Dict[str, int], Dict[str, int], Dict[Tuple[str, str, str], int]],
+    ) -> int:
+        """Insert one chunk of changed packages and their relationships; return the unchanged count."""
+        license_ids, arch_ids, maintainer_ids = lookup_ids
+        unchanged = 0
         package_tuples = []
         license_relationships = []
         architecture_relationships = []
@@ -550,7 +697,7 @@ class SQLiteWriter:
             search_text = " ".join(filter(None, search_parts))
             
             # Package tuple for main packages table
-            package_tuples.append((
+            row = (
                 pkg_id,
                 p.get("packageName") or "",
                 p.get("version") or "",
@@ -567,10 +714,14 @@ class SQLiteWriter:
                 bool(p.get("unsupported", False)),
                 p.get("mainProgram") or "",
                 p.get("position") or "",
-                json.dumps(p.get("outputsToInstall")) if p.get("outputsToInstall") else "",
+                self._json_column(p.get("outputsToInstall")) if p.get("outputsToInstall") else "",
                 p.get("lastUpdated") or "",
-                int(p.get("content_hash") or 0)
-            ))
+            )
+            content_hash = self._content_hash(row, p)
+            if existing_hashes.get(pkg_id) == content_hash:
+                unchanged += 1
+                continue
+            package_tuples.append(row + (content_hash,))
             
             # Extract system from attribute path for variations
             system = self._extract_system_from_attribute_path(p.get("attributePath", ""))
@@ -580,7 +731,7 @@ class SQLiteWriter:
                     pkg_id,
                     system,
                     p.get("drvPath", ""),
-                    json.dumps(p.get("outputs", {}))
+                    self._json_column(p.get("outputs", {}))
                 ))
             
             # License relationships
@@ -588,7 +739,7 @@ class SQLiteWriter:
             if license_info:
                 if isinstance(license_info, dict):
                     if license_info.get("type") == "array":
-                        for lic in license_info.get("licenses", []):
+                        for lic in license_info.get("licenses") or ():
                             if lic and lic.get("shortName"):
                                 license_relationships.append((pkg_id, lic["shortName"]))
                     elif license_info.get("shortName"):
@@ -597,14 +748,14 @@ class SQLiteWriter:
                     license_relationships.append((pkg_id, license_info))
             
             # Architecture relationships
-            platforms = p.get("platforms", [])
+            platforms = p.get("platforms")
             if isinstance(platforms, list):
                 for platform in platforms:
                     if isinstance(platform, str):
                         architecture_relationships.append((pkg_id, platform))
             
             # Maintainer relationships
-            package_maintainers = p.get("maintainers", [])
+            package_maintainers = p.get("maintainers")
             if isinstance(package_maintainers, list):
                 for maintainer in package_maintainers:
                     if isinstance(maintainer, dict):
@@ -618,43 +769,64 @@ class SQLiteWriter:
         
         # Insert packages
         if package_tuples:
-            cursor.executemany("""
-                INSERT OR REPLACE INTO packages (
-                    package_id, package_name, version, attribute_path, description, 
-                    long_description, search_text, homepage, category, broken, unfree, 
-                    available, insecure, unsupported, main_program, position, 
-                    outputs_to_install, last_updated, content_hash
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, package_tuples)
+            # Upsert rather than INSERT OR REPLACE: on re-runs against an
+            # existing database the row is updated in place (same rowid)
+            # instead of being deleted and re-inserted
+            cursor.executemany(_UPSERT_PACKAGES_SQL, package_tuples)
         
         # Insert variations
         if variation_tuples:
             cursor.executemany("""
-                INSERT OR REPLACE INTO package_variations (variation_id, package_id, system, drv_path, outputs)
+                INSERT INTO package_variations (variation_id, package_id, system, drv_path, outputs)
                 VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(variation_id) DO UPDATE SET
+                    drv_path = excluded.drv_path,
+                    outputs = excluded.outputs
             """, variation_tuples)
         
         # Insert license relationships
         if license_relationships:
-            cursor.executemany("""
-                INSERT OR IGNORE INTO package_licenses (package_id, license_id)
-                SELECT ?, license_id FROM licenses WHERE short_name = ?
-            """, license_relationships)
+            cursor.executemany(
+                "INSERT OR IGNORE INTO package_licenses (package_id, license_id) VALUES (?, ?)",
+                [(pkg_id, license_ids[name]) for pkg_id, name in license_relationships if name in license_ids]
+            )
         
         # Insert architecture relationships
         if architecture_relationships:
-            cursor.executemany("""
-                INSERT OR IGNORE INTO package_architectures (package_id, arch_id)
-                SELECT ?, arch_id FROM architectures WHERE name = ?
-            """, architecture_relationships)
+            cursor.executemany(
+                "INSERT OR IGNORE INTO package_architectures (package_id, arch_id) VALUES (?, ?)",
+                [(pkg_id, arch_ids[name]) for pkg_id, name in architecture_relationships if name in arch_ids]
+            )
         
-        # Insert maintainer relationships
+        # Insert maintainer relationships (matched on the full unique
+        # (name, email, github) key, not on any single field)
         if maintainer_relationships:
-            cursor.executemany("""
-                INSERT OR IGNORE INTO package_maintainers (package_id, maintainer_id)
-                SELECT ?, maintainer_id FROM maintainers 
-                WHERE (name = ? OR email = ? OR github = ?) AND (name != '' OR email != '' OR github != '')
-            """, [(pkg_id, key[0], key[1], key[2]) for pkg_id, key in maintainer_relationships])
+            cursor.executemany(
+                "INSERT OR IGNORE INTO package_maintainers (package_id, maintainer_id) VALUES (?, ?)",
+                [(pkg_id, maintainer_ids[key]) for pkg_id, key in maintainer_relationships if key in maintainer_ids]
+            )
+        
+        return unchanged
+
+    def _content_hash(self, row: tuple, p: Dict[str, Any]) -> int:
+        """Signed 64-bit hash of a package's row values and its related metadata.
+
+        The trailing last_updated value is left out: it is stamped on every
+        run and would make every package look changed.
+        """
+        digest = hashlib.blake2b(repr(row[:-1]).encode("utf-8", "surrogatepass"), digest_size=8)
+        digest.update(self._json_column([
+            p.get("drvPath", ""), p.get("outputs", {}),
+            p.get("license"), p.get("platforms"), p.get("maintainers"),
+        ]).encode("utf-8", "surrogatepass"))
+        return int.from_bytes(digest.digest(), "big", signed=True)
+
+    @staticmethod
+    def _json_column(value: Any) -> str:
+        """Serialize a value for a JSON TEXT column (orjson when available)."""
+        if orjson is not None:
+            return orjson.dumps(value).decode('utf-8')
+        return json.dumps(value)
 
     def _extract_system_from_attribute_path(self, attribute_path: str) -> str:
         """Extract system/architecture from attribute path."""
@@ -673,9 +845,9 @@ class SQLiteWriter:
         attr_path = p.get("attributePath", "").strip()
         if attr_path:
             # Remove system suffix if present
-            parts = attr_path.split(".")
-            if len(parts) >= 2 and any(sys in parts[-1] for sys in ["linux", "darwin", "windows"]):
-                return ".".join(parts[:-1])
+            head, sep, last = attr_path.rpartition(".")
+            if sep and any(marker in last for marker in _SYSTEM_MARKERS):
+                return head
             return attr_path
         
         # Fallback to name@version
@@ -683,8 +855,12 @@ class SQLiteWriter:
         ver = (p.get("version") or "").strip()
         return f"{name}@{ver}" if name or ver else "unknown"
     
-    def create_minified_db_from_main(self, main_db_path: str) -> None:
-        """Create a minified database with zstd compression from main database."""
+    def create_minified_db_from_main(self, main_db_path: str, upload: bool = True) -> "MinifiedWriter":
+        """Create a minified database with zstd compression from main database.
+        
+        Returns the MinifiedWriter used; with upload=False its artifacts are
+        left for the caller to upload.
+        """
         self._ensure_parent_dir()
         
         if MinifiedWriter is None:
@@ -695,8 +871,9 @@ class SQLiteWriter:
         logger.info("Using MinifiedWriter with zstd compression (this preserves all metadata)")
 
         # Get zstd configuration from environment
-        dict_size = int(os.environ.get("ZSTD_DICT_SIZE", "65536"))
-        sample_count = int(os.environ.get("ZSTD_SAMPLE_COUNT", "10000"))
+        # Dictionary size and sample count scale with the package count unless set
+        dict_size = int(os.environ["ZSTD_DICT_SIZE"]) if os.environ.get("ZSTD_DICT_SIZE") else None
+        sample_count = int(os.environ["ZSTD_SAMPLE_COUNT"]) if os.environ.get("ZSTD_SAMPLE_COUNT") else None
         compression_level = int(os.environ.get("ZSTD_COMPRESSION_LEVEL", "3"))
         
         # Create minified writer with zstd compression
@@ -717,125 +894,132 @@ class SQLiteWriter:
         
         # Create minified database with zstd compression
         logger.info("Writing compressed minified database with %d packages...", len(packages))
-        minified_writer.write_artifact(packages)
+        minified_writer.write_artifact(packages, upload=upload)
         
         logger.info("Zstd-compressed minified database created: %s", self.output_path)
+        return minified_writer
 
     
     def _extract_packages_from_main_db(self, main_db_path: str) -> List[Dict[str, Any]]:
         """Extract package data from main database for zstd compression."""
-        main_conn = sqlite3.connect(main_db_path)
+        main_conn = self._connect_readonly(main_db_path)
         main_cursor = main_conn.cursor()
         
-        # Extract package data from main packages table
+        # Relationships are read with one scan per junction table and grouped
+        # by package, instead of three lookups per package
+        logger.info("Extracting license, maintainer and platform relationships...")
+        licenses_by_package: Dict[str, List[Dict[str, Any]]] = {}
+        main_cursor.execute("""
+            SELECT pl.package_id, l.short_name, l.full_name, l.spdx_id, l.url,
+                   l.is_free, l.is_redistributable, l.is_deprecated
+            FROM package_licenses pl
+            JOIN licenses l ON l.license_id = pl.license_id
+        """)
+        for lic_row in self._iter_rows(main_cursor):
+            licenses_by_package.setdefault(lic_row[0], []).append({
+                'shortName': lic_row[1],
+                'fullName': lic_row[2],
+                'spdxId': lic_row[3],
+                'url': lic_row[4],
+                'free': lic_row[5],
+                'redistributable': lic_row[6],
+                'deprecated': lic_row[7]
+            })
+        
+        maintainers_by_package: Dict[str, List[Dict[str, Any]]] = {}
+        main_cursor.execute("""
+            SELECT pm.package_id, m.name, m.email, m.github, m.github_id
+            FROM package_maintainers pm
+            JOIN maintainers m ON m.maintainer_id = pm.maintainer_id
+        """)
+        for maint_row in self._iter_rows(main_cursor):
+            maintainer = {}
+            # Only add fields that have values
+            if maint_row[1]:  # name
+                maintainer['name'] = maint_row[1]
+            if maint_row[2]:  # email
+                maintainer['email'] = maint_row[2]
+            if maint_row[3]:  # github
+                maintainer['github'] = maint_row[3]
+            if maint_row[4] is not None:  # github_id (can be 0)
+                maintainer['githubId'] = maint_row[4]
+            
+            # Add maintainer if it has any data (githubId alone is valid)
+            if maintainer:
+                maintainers_by_package.setdefault(maint_row[0], []).append(maintainer)
+        
+        platforms_by_package: Dict[str, List[str]] = {}
+        main_cursor.execute("""
+            SELECT pa.package_id, a.name
+            FROM package_architectures pa
+            JOIN architectures a ON a.arch_id = pa.arch_id
+        """)
+        for package_id, arch_name in self._iter_rows(main_cursor):
+            platforms_by_package.setdefault(package_id, []).append(arch_name)
+        
+        # Extract package data from main packages table, keyed the same way
+        # (camelCase) as the processed packages the MinifiedWriter consumes
         logger.info("Extracting package data from main database...")
         main_cursor.execute("""
-            SELECT package_id, package_name, version, attribute_path, description, 
-                   long_description, homepage, category, broken, unfree, available, 
-                   insecure, unsupported, main_program, position, outputs_to_install, 
-                   last_updated, content_hash
+            SELECT package_id, package_name AS packageName, version,
+                   attribute_path AS attributePath, description,
+                   long_description AS longDescription, homepage, category, broken, unfree,
+                   available, insecure, unsupported, main_program AS mainProgram, position,
+                   outputs_to_install AS outputsToInstall, last_updated AS lastUpdated
             FROM packages
         """)
         
         columns = [desc[0] for desc in main_cursor.description]
         packages = []
         
-        for row in main_cursor.fetchall():
+        for row in self._iter_rows(main_cursor):
             pkg = dict(zip(columns, row))
             package_id = pkg['package_id']
             
-            # Convert outputs_to_install back to object if it exists
-            if pkg.get('outputs_to_install'):
+            # Convert outputsToInstall back to object if it exists
+            if pkg.get('outputsToInstall'):
                 try:
-                    pkg['outputs_to_install'] = json.loads(pkg['outputs_to_install'])
+                    pkg['outputsToInstall'] = json.loads(pkg['outputsToInstall'])
                 except (json.JSONDecodeError, TypeError):
                     pass
+            else:
+                pkg['outputsToInstall'] = None
             
-            # Extract licenses from junction table
-            main_cursor.execute("""
-                SELECT l.short_name, l.full_name, l.spdx_id, l.url, l.is_free, l.is_redistributable, l.is_deprecated
-                FROM licenses l
-                JOIN package_licenses pl ON l.license_id = pl.license_id
-                WHERE pl.package_id = ?
-            """, (package_id,))
-            
-            licenses = []
-            for lic_row in main_cursor.fetchall():
-                licenses.append({
-                    'shortName': lic_row[0],
-                    'fullName': lic_row[1],
-                    'spdxId': lic_row[2],
-                    'url': lic_row[3],
-                    'free': lic_row[4],
-                    'redistributable': lic_row[5],
-                    'deprecated': lic_row[6]
-                })
-            
-            if len(licenses) == 1:
+            licenses = licenses_by_package.get(package_id)
+            if not licenses:
+                pkg['license'] = None
+            elif len(licenses) == 1:
                 pkg['license'] = licenses[0]
-            elif len(licenses) > 1:
+            else:
                 pkg['license'] = {
                     'type': 'array',
                     'licenses': licenses
                 }
-            else:
-                pkg['license'] = None
-            
-            # Extract maintainers from junction table
-            main_cursor.execute("""
-                SELECT m.name, m.email, m.github, m.github_id
-                FROM maintainers m
-                JOIN package_maintainers pm ON m.maintainer_id = pm.maintainer_id
-                WHERE pm.package_id = ?
-            """, (package_id,))
             
-            maintainers = []
-            for maint_row in main_cursor.fetchall():
-                maintainer = {}
-                # Only add fields that have values
-                if maint_row[0]:  # name
-                    maintainer['name'] = maint_row[0]
-                if maint_row[1]:  # email
-                    maintainer['email'] = maint_row[1]
-                if maint_row[2]:  # github
-                    maintainer['github'] = maint_row[2]
-                if maint_row[3] is not None:  # github_id (can be 0)
-                    maintainer['githubId'] = maint_row[3]
-                
-                # Add maintainer if it has any data (githubId alone is valid)
-                if maintainer:
-                    maintainers.append(maintainer)
-            
-            pkg['maintainers'] = maintainers if maintainers else None
-            
-            # Extract platforms (architectures) from junction table
-            main_cursor.execute("""
-                SELECT a.name
-                FROM architectures a
-                JOIN package_architectures pa ON a.arch_id = pa.arch_id
-                WHERE pa.package_id = ?
-            """, (package_id,))
-            
-            platforms = [row[0] for row in main_cursor.fetchall()]
-            pkg['platforms'] = platforms if platforms else None
+            pkg['maintainers'] = maintainers_by_package.get(package_id)
+            pkg['platforms'] = platforms_by_package.get(package_id)
             
             packages.append(pkg)
         
         main_conn.close()
         
         # Log statistics about extracted data
-        packages_with_licenses = sum(1 for p in packages if p.get('license'))
-        packages_with_maintainers = sum(1 for p in packages if p.get('maintainers'))
-        packages_with_platforms = sum(1 for p in packages if p.get('platforms'))
-        
         logger.info("Extracted %d packages from main database", len(packages))
-        logger.info("  - Packages with licenses: %d", packages_with_licenses)
-        logger.info("  - Packages with maintainers: %d", packages_with_maintainers)
-        logger.info("  - Packages with platforms: %d", packages_with_platforms)
+        logger.info("  - Packages with licenses: %d", len(licenses_by_package))
+        logger.info("  - Packages with maintainers: %d", len(maintainers_by_package))
+        logger.info("  - Packages with platforms: %d", len(platforms_by_package))
         
         return packages
 
-  
+    @staticmethod
+    def _iter_rows(cursor: sqlite3.Cursor, batch_size: int = _FETCH_BATCH_SIZE):
+        """Yield a query's rows in fetchmany batches instead of one fetchall list."""
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
     def _delete_s3_objects(self, bucket: str, prefix: str) -> None:
         """Delete all objects with given prefix from S3 bucket."""
         if boto3 is None:
@@ -843,7 +1027,7 @@ class SQLiteWriter:
             return
             
         try:
-            s3 = boto3.client("s3", region_name=self.region)
+            s3 = s3_client(self.region)
             response = s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
             
             if 'Contents' in response:
@@ -862,7 +1046,8 @@ class SQLiteWriter:
         except Exception as e:
             logger.warning("Failed to delete S3 objects at %s/%s: %s", bucket, prefix, e)
 
-    def _upload_to_s3(self) -> None:
+    def upload(self) -> None:
+        """Upload the database file to s3_bucket/s3_key, if configured."""
         if not (self.region and self.s3_bucket and self.s3_key):
             logger.info("S3 upload not configured; skipping.")
             return
@@ -884,7 +1069,10 @@ class SQLiteWriter:
             self._delete_s3_objects(self.s3_bucket, self.s3_key)
         
         # Upload the SQLite database file
-        s3 = boto3.client("s3", region_name=self.region)
-        s3.upload_file(str(self.output_path), self.s3_bucket, self.s3_key)
+        s3 = s3_client(self.region)
+        s3.upload_file(
+            str(self.output_path), self.s3_bucket, self.s3_key,
+            ExtraArgs=upload_extra_args(), Config=transfer_config(self.output_path.stat().st_size),
+        )
         
         logger.info("Upload complete.")
\ No newline at end of file
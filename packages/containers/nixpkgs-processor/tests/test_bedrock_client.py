@@ -0,0 +1,72 @@
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from bedrock_client import BedrockClient  # noqa: E402
+
+
+def _client_error(code: str, status: int) -> ClientError:
+    return ClientError(
+        {"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+        "InvokeModel",
+    )
+
+
+class GenerateEmbeddingsRequestRetryTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        env = mock.patch.dict(os.environ, {"AWS_REGION": "us-east-1", "BEDROCK_MAX_RPM": "60000"})
+        env.start()
+        self.addCleanup(env.stop)
+        self.client = BedrockClient()
+        # No real backoff in tests
+        delay = mock.patch.object(BedrockClient, "_retry_delay", return_value=0)
+        delay.start()
+        self.addCleanup(delay.stop)
+
+    async def test_service_unavailable_is_retried_without_counting_a_throttle(self) -> None:
+        invoke = mock.Mock(side_effect=[_client_error("ServiceUnavailableException", 503), [0.5, 0.25]])
+        with mock.patch.object(self.client, "_invoke_model", invoke), \
+                mock.patch.object(self.client, "_record_throttle", wraps=self.client._record_throttle) as throttle:
+            embedding = await self.client._generate_embeddings_request("hello")
+
+        self.assertEqual(embedding, [0.5, 0.25])
+        self.assertEqual(invoke.call_count, 2)
+        throttle.assert_not_called()
+        self.assertEqual(self.client._throttle_streak, 0)
+
+    async def test_throttle_is_counted_once(self) -> None:
+        invoke = mock.Mock(side_effect=[_client_error("ThrottlingException", 429), [1.0]])
+        with mock.patch.object(self.client, "_invoke_model", invoke), \
+                mock.patch.object(self.client, "_record_throttle", wraps=self.client._record_throttle) as throttle:
+            embedding = await self.client._generate_embeddings_request("hello")
+
+        self.assertEqual(embedding, [1.0])
+        self.assertEqual(invoke.call_count, 2)
+        throttle.assert_called_once()
+
+    async def test_transient_retries_are_bounded(self) -> None:
+        self.client.max_transient_retries = 2
+        invoke = mock.Mock(side_effect=_client_error("InternalServerException", 500))
+        with mock.patch.object(self.client, "_invoke_model", invoke):
+            with self.assertRaises(ClientError):
+                await self.client._generate_embeddings_request("hello")
+
+        self.assertEqual(invoke.call_count, 3)
+
+    async def test_client_errors_are_not_retried(self) -> None:
+        invoke = mock.Mock(side_effect=_client_error("ValidationException", 400))
+        with mock.patch.object(self.client, "_invoke_model", invoke):
+            with self.assertRaises(ClientError):
+                await self.client._generate_embeddings_request("hello")
+
+        self.assertEqual(invoke.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
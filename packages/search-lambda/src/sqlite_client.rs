@@ -171,7 +171,9 @@ impl SQLiteClient {
             format!("SELECT id, name, description, bm25(packages_fts) as relevance_score FROM packages_fts WHERE packages_fts MATCH ? {} ORDER BY relevance_score DESC LIMIT ? OFFSET ?", where_clause)
         };
 
-        let mut fts_stmt = conn.prepare(&fts_query)?;
+        // Statements are prepared through the connection's statement cache, so
+        // warm invocations reuse the compiled SQL instead of re-parsing it
+        let mut fts_stmt = conn.prepare_cached(&fts_query)?;
         let fts_rows = fts_stmt.query_map(
             rusqlite::params![params.query, params.limit, params.offset],
             |row| {
@@ -213,10 +215,10 @@ impl SQLiteClient {
         }).collect();
 
         // Get full compressed data for each package
+        let mut data_stmt = conn.prepare_cached("SELECT data FROM packages_kv WHERE id = ?")?;
         for (i, package_id_tuple) in package_ids.iter().enumerate() {
             let package_id = &package_id_tuple.0;
-            match conn.query_row(
-                "SELECT data FROM packages_kv WHERE id = ?",
+            match data_stmt.query_row(
                 [package_id],
                 |row| row.get::<_, Vec<u8>>(0)
             ) {
@@ -238,7 +240,7 @@ impl SQLiteClient {
 
         // Get total count
         let count_query = "SELECT COUNT(*) FROM packages_fts WHERE packages_fts MATCH ?";
-        let mut count_stmt = conn.prepare(count_query)?;
+        let mut count_stmt = conn.prepare_cached(count_query)?;
         results.total_count = count_stmt.query_row(
             rusqlite::params![params.query],
             |row| row.get(0)